@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Stand-in DigitalSMS and Brevo APIs for offline load tests.
+
+    uvicorn fake_providers:app --port 9000
+
+    DIGITALSMS_API_URL=http://localhost:9000/api
+    BREVO_API_URL=http://localhost:9000/v3          # set for the backend under test
+
+Implements the request/response shapes the backend relies on: DigitalSMS
+`GET /api?apikey=&mobile=&msg=&img1=` and Brevo `POST /v3/smtp/email`, including
+messageVersions batches. Nothing is delivered. Latency, error rate and per-key rate
+limits start from the FAKE_PROVIDER_* variables and can be changed while a
+benchmark runs:
+
+    curl -X PUT localhost:9000/_fake/config -H 'Content-Type: application/json' \\
+         -d '{"brevo": {"error_rate": 0.3}}'
+    curl localhost:9000/_fake/stats
+"""
+
+import asyncio
+import os
+import random
+import time
+import uuid
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
+
+
+class ProviderBehaviour(BaseModel):
+    latency_ms: float = float(os.environ.get('FAKE_PROVIDER_LATENCY_MS', '100'))
+    latency_jitter_ms: float = float(os.environ.get('FAKE_PROVIDER_LATENCY_JITTER_MS', '50'))
+    # Share of requests answered with a 5xx (or `error_status`) after the latency
+    error_rate: float = float(os.environ.get('FAKE_PROVIDER_ERROR_RATE', '0'))
+    error_status: int = int(os.environ.get('FAKE_PROVIDER_ERROR_STATUS', '503'))
+    # Requests per second per API key; 0 disables the limit
+    rate_limit: float = float(os.environ.get('FAKE_PROVIDER_RATE_LIMIT', '0'))
+    rate_burst: float = float(os.environ.get('FAKE_PROVIDER_RATE_BURST', '10'))
+
+
+class BehaviourUpdate(BaseModel):
+    digitalsms: Optional[dict] = None
+    brevo: Optional[dict] = None
+
+
+app = FastAPI(title="Fake message providers")
+
+behaviour: Dict[str, ProviderBehaviour] = {
+    "digitalsms": ProviderBehaviour(),
+    "brevo": ProviderBehaviour()
+}
+stats: Dict[str, Dict[str, int]] = {
+    provider: {"requests": 0, "accepted": 0, "messages": 0, "rate_limited": 0, "errors": 0, "rejected": 0}
+    for provider in behaviour
+}
+# (provider, api key) -> [tokens, updated_at]
+buckets: Dict[tuple, list] = {}
+
+
+def take_token(provider: str, api_key: str) -> float:
+    """Take a request token for the key; returns 0 when allowed, else seconds until one is free"""
+    config = behaviour[provider]
+    if config.rate_limit <= 0:
+        return 0
+    now = time.monotonic()
+    bucket = buckets.setdefault((provider, api_key), [config.rate_burst, now])
+    bucket[0] = min(config.rate_burst, bucket[0] + (now - bucket[1]) * config.rate_limit)
+    bucket[1] = now
+    if bucket[0] >= 1:
+        bucket[0] -= 1
+        return 0
+    return (1 - bucket[0]) / config.rate_limit
+
+
+async def simulate(provider: str, api_key: str):
+    """Apply latency, rate limiting and error injection; returns a response to short-circuit with"""
+    config = behaviour[provider]
+    stats[provider]["requests"] += 1
+
+    latency = max(0.0, random.gauss(config.latency_ms, config.latency_jitter_ms)) / 1000
+    await asyncio.sleep(latency)
+
+    wait = take_token(provider, api_key)
+    if wait:
+        stats[provider]["rate_limited"] += 1
+        headers = {"Retry-After": str(max(1, round(wait)))}
+        if provider == "brevo":
+            return JSONResponse(
+                {"code": "too_many_requests", "message": "The expected rate limit is exceeded."},
+                status_code=429,
+                headers=headers
+            )
+        return PlainTextResponse("Too Many Requests", status_code=429, headers=headers)
+
+    if random.random() < config.error_rate:
+        stats[provider]["errors"] += 1
+        if provider == "brevo":
+            return JSONResponse(
+                {"code": "internal_error", "message": "Injected failure"},
+                status_code=config.error_status
+            )
+        return PlainTextResponse("Service Unavailable", status_code=config.error_status)
+
+    return None
+
+
+# DigitalSMS
+@app.get("/api")
+async def digitalsms_send(apikey: str = "", mobile: str = "", msg: str = "", img1: Optional[str] = None):
+    failure = await simulate("digitalsms", apikey)
+    if failure:
+        return failure
+
+    # DigitalSMS answers HTTP 200 and reports failures in the body
+    if not apikey:
+        stats["digitalsms"]["rejected"] += 1
+        return {"status": 0, "statuscode": 403, "message": "Invalid API key"}
+    if not (mobile.isdigit() and len(mobile) == 10) or not msg:
+        stats["digitalsms"]["rejected"] += 1
+        return {"status": 0, "statuscode": 400, "message": "Invalid mobile number or message"}
+
+    stats["digitalsms"]["accepted"] += 1
+    stats["digitalsms"]["messages"] += 1
+    return {"status": 1, "statuscode": 200, "message": "Message queued successfully", "requestid": str(uuid.uuid4())}
+
+
+# Brevo
+def brevo_error(code: str, message: str, status_code: int = 400):
+    return JSONResponse({"code": code, "message": message}, status_code=status_code)
+
+
+def message_id() -> str:
+    return f"<{uuid.uuid4().hex}@smtp-relay.mailin.fr>"
+
+
+@app.post("/v3/smtp/email")
+async def brevo_send(request: Request):
+    api_key = request.headers.get("api-key", "")
+    failure = await simulate("brevo", api_key)
+    if failure:
+        return failure
+
+    if not api_key:
+        stats["brevo"]["rejected"] += 1
+        return brevo_error("unauthorized", "Key not found", 401)
+
+    try:
+        payload = await request.json()
+    except ValueError:
+        stats["brevo"]["rejected"] += 1
+        return brevo_error("bad_request", "Input must be a valid JSON object")
+
+    if not (payload.get("sender") or {}).get("email"):
+        stats["brevo"]["rejected"] += 1
+        return brevo_error("missing_parameter", "sender is missing")
+    if not payload.get("subject") or not payload.get("htmlContent"):
+        stats["brevo"]["rejected"] += 1
+        return brevo_error("missing_parameter", "subject and htmlContent are required")
+
+    versions = payload.get("messageVersions")
+    recipient_lists = [version.get("to") for version in versions] if versions else [payload.get("to")]
+    for recipients in recipient_lists:
+        if not recipients or any("@" not in (recipient.get("email") or "") for recipient in recipients):
+            # Like Brevo, one bad recipient rejects the whole call
+            stats["brevo"]["rejected"] += 1
+            return brevo_error("invalid_parameter", "email is not valid in to")
+
+    stats["brevo"]["accepted"] += 1
+    stats["brevo"]["messages"] += len(recipient_lists)
+    if versions:
+        return JSONResponse({"messageIds": [message_id() for _ in versions]}, status_code=201)
+    return JSONResponse({"messageId": message_id()}, status_code=201)
+
+
+# Runtime control
+@app.get("/_fake/config")
+async def get_config():
+    return {provider: config.dict() for provider, config in behaviour.items()}
+
+
+@app.put("/_fake/config")
+async def update_config(update: BehaviourUpdate):
+    """Change one or both providers' behaviour; omitted fields keep their value"""
+    for provider, changes in update.dict().items():
+        if changes:
+            behaviour[provider] = ProviderBehaviour(**{**behaviour[provider].dict(), **changes})
+            buckets.clear()
+    return await get_config()
+
+
+@app.get("/_fake/stats")
+async def get_stats():
+    return stats
+
+
+@app.delete("/_fake/stats")
+async def reset_stats():
+    for counters in stats.values():
+        for key in counters:
+            counters[key] = 0
+    buckets.clear()
+    return stats
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Command-line reminder runs, sharded across processes or nodes.
+
+    python -m reminders run                  # whole run in this process
+    python -m reminders run --shard 2/8      # only users hashed into shard 2 of 8
+    python -m reminders run --local 8        # 8 local processes, one per shard
+    python -m reminders plan --now 2024-06-02T00:00:00+00:00 --hours 24
+                                             # NDJSON send plan; nothing is claimed or sent
+
+Run from the backend directory (like `uvicorn server:app`). Every shard claims its
+users with the same conditional update as the API tick, so overlapping runs never
+send twice. Shards of one run share a run id and $inc into a single ReminderLog.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import server
+
+
+def parse_shard(value: str) -> tuple:
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard must look like i/N, e.g. 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError("shard index must be in 0..N-1")
+    return index, count
+
+
+async def run_shard(run_id: str, execution_time: str, shard: tuple = None) -> dict:
+    run = server.ReminderRunContext(execution_time=datetime.fromisoformat(execution_time), run_id=run_id)
+    try:
+        return await server.run_daily_reminders(run, shard)
+    finally:
+        await server.delivery_events.flush()
+        await server.close_http_client()
+        server.client.close()
+
+
+async def plan(now: datetime, hours: float, shard: tuple = None, bucket_minutes: int = 15):
+    try:
+        async for entry in server.plan_daily_reminders(now, hours, shard, bucket_minutes):
+            print(json.dumps(entry, default=str), flush=True)
+    finally:
+        await server.delivery_events.flush()
+        await server.close_http_client()
+        server.client.close()
+
+
+def parse_now(value: str) -> datetime:
+    try:
+        now = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("now must be an ISO datetime")
+    return now if now.tzinfo else now.replace(tzinfo=timezone.utc)
+
+
+def run_shard_process(run_id: str, execution_time: str, shard: tuple) -> dict:
+    """ProcessPoolExecutor entry point; each process opens its own Mongo client"""
+    return asyncio.run(run_shard(run_id, execution_time, shard))
+
+
+def run_local(processes: int, run_id: str, execution_time: str) -> dict:
+    """Run every shard in its own process and merge their results"""
+    results = {
+        "run_id": run_id,
+        "execution_time": execution_time,
+        "date": execution_time[:10],
+        "shards": processes,
+        **server.new_reminder_results()
+    }
+    # spawn rather than fork: a forked child would inherit the parent's Mongo client
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        futures = [
+            executor.submit(run_shard_process, run_id, execution_time, (index, processes))
+            for index in range(processes)
+        ]
+        for future in futures:
+            server.merge_reminder_results(results, future.result())
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run birthday/anniversary reminders")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Run one reminder tick")
+    mode = run_parser.add_mutually_exclusive_group()
+    mode.add_argument("--shard", type=parse_shard, help="Only process shard i of N (i/N)")
+    mode.add_argument("--local", type=int, metavar="N", help="Run all N shards in local processes")
+    run_parser.add_argument("--run-id", help="Run id shared by the shards of one run (default: new id)")
+    plan_parser = subparsers.add_parser("plan", help="Print the send plan as NDJSON without sending")
+    plan_parser.add_argument("--now", type=parse_now, help="Plan as if the tick ran at this time (default: now)")
+    plan_parser.add_argument("--hours", type=float, default=0, help="Also plan the slots this many hours ahead")
+    plan_parser.add_argument("--shard", type=parse_shard, help="Only plan shard i of N (i/N)")
+    plan_parser.add_argument("--bucket-minutes", type=int, default=15, help="Summary window size")
+    args = parser.parse_args(argv)
+
+    if args.command == "plan":
+        asyncio.run(plan(args.now, args.hours, args.shard, args.bucket_minutes))
+        return 0
+
+    run_id = args.run_id or str(uuid.uuid4())
+    execution_time = datetime.now(timezone.utc).isoformat()
+
+    if args.local:
+        results = run_local(args.local, run_id, execution_time)
+    else:
+        results = asyncio.run(run_shard(run_id, execution_time, args.shard))
+
+    print(json.dumps(results, indent=2, default=str))
+    return 1 if results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
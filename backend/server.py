@@ -1,11 +1,15 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
+from abc import ABC, abstractmethod
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional
@@ -26,6 +30,19 @@ import pytz
 import random
 import secrets
 import string
+import socket
+import httpx
+import hashlib
+import heapq
+import math
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from jinja2 import DictLoader, TemplateError, nodes
+from jinja2.exceptions import SecurityError
+from jinja2.sandbox import SandboxedEnvironment
+from markupsafe import Markup, escape
+from collections import deque
 
 
 ROOT_DIR = Path(__file__).parent
@@ -43,10 +60,109 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 
 # LLM settings
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
+MESSAGE_LLM_MODEL = ("openai", "gpt-4o")
 
 # Backend URL for image URLs
 BACKEND_URL = os.environ.get('BACKEND_URL', 'http://localhost:8001')
 
+# Daily reminder concurrency limits (set all to 1 for a strictly sequential run)
+REMINDER_USER_CONCURRENCY = int(os.environ.get('REMINDER_USER_CONCURRENCY', '10'))
+REMINDER_CONTACT_CONCURRENCY = int(os.environ.get('REMINDER_CONTACT_CONCURRENCY', '5'))
+REMINDER_WHATSAPP_CONCURRENCY = int(os.environ.get('REMINDER_WHATSAPP_CONCURRENCY', '10'))
+REMINDER_EMAIL_CONCURRENCY = int(os.environ.get('REMINDER_EMAIL_CONCURRENCY', '10'))
+
+# Documents fetched per round trip when streaming large result sets
+MONGO_BATCH_SIZE = int(os.environ.get('MONGO_BATCH_SIZE', '500'))
+
+# A user is due when their next send instant falls within this many minutes of a tick
+REMINDER_SEND_WINDOW_MINUTES = int(os.environ.get('REMINDER_SEND_WINDOW_MINUTES', '15'))
+
+# A claimed user whose run never completes (crash, deploy) is picked up again after this long
+REMINDER_CLAIM_LEASE_MINUTES = int(os.environ.get('REMINDER_CLAIM_LEASE_MINUTES', '30'))
+
+# Longest look-ahead, in hours, of a dry run requested through the API
+REMINDER_PLAN_MAX_HOURS = float(os.environ.get('REMINDER_PLAN_MAX_HOURS', '48'))
+
+# Slowest contacts kept in each run's timing breakdown
+REMINDER_SLOWEST_CONTACTS = int(os.environ.get('REMINDER_SLOWEST_CONTACTS', '10'))
+
+# Outbound delivery: "queue" hands sends to the outbound_jobs worker pool, "inline" sends during the run
+REMINDER_DELIVERY_MODE = os.environ.get('REMINDER_DELIVERY_MODE', 'queue')
+OUTBOUND_WORKERS = int(os.environ.get('OUTBOUND_WORKERS', '4'))
+OUTBOUND_LEASE_SECONDS = int(os.environ.get('OUTBOUND_LEASE_SECONDS', '120'))
+OUTBOUND_MAX_ATTEMPTS = int(os.environ.get('OUTBOUND_MAX_ATTEMPTS', '5'))
+# Retry delay doubles from the base up to the cap; each delay is jittered between half and all of it
+OUTBOUND_RETRY_BASE_SECONDS = float(os.environ.get('OUTBOUND_RETRY_BASE_SECONDS', '30'))
+OUTBOUND_RETRY_MAX_SECONDS = float(os.environ.get('OUTBOUND_RETRY_MAX_SECONDS', '3600'))
+OUTBOUND_POLL_INTERVAL_SECONDS = float(os.environ.get('OUTBOUND_POLL_INTERVAL_SECONDS', '2'))
+
+# Identifies this process in job leases
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+# How long sent_ledger entries are kept (they only need to outlive the send window)
+SENT_LEDGER_RETENTION_DAYS = int(os.environ.get('SENT_LEDGER_RETENTION_DAYS', '7'))
+
+# AI message pre-generation for upcoming events (0 days disables the background stage)
+PREGENERATION_DAYS_AHEAD = int(os.environ.get('PREGENERATION_DAYS_AHEAD', '3'))
+PREGENERATION_INTERVAL_MINUTES = int(os.environ.get('PREGENERATION_INTERVAL_MINUTES', '60'))
+PREGENERATION_CONCURRENCY = int(os.environ.get('PREGENERATION_CONCURRENCY', '5'))
+
+# In-process scheduler; one replica at a time holds each job's lease and runs it
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+SCHEDULER_TICK_SECONDS = float(os.environ.get('SCHEDULER_TICK_SECONDS', '60'))
+SCHEDULER_LEASE_SECONDS = int(os.environ.get('SCHEDULER_LEASE_SECONDS', '30'))
+
+# Provider credentials are cached per process for this long; saving settings invalidates the
+# entry on the replica that handled the save, other replicas pick the change up on expiry
+SETTINGS_CACHE_TTL_SECONDS = float(os.environ.get('SETTINGS_CACHE_TTL_SECONDS', '60'))
+SETTINGS_CACHE_MAX_USERS = int(os.environ.get('SETTINGS_CACHE_MAX_USERS', '10000'))
+
+# Delivery webhook events are buffered and bulk-written once this many are waiting, or
+# every few seconds; the webhooks reject every call until a token is set, which must then
+# be passed as ?token= on the webhook URLs
+DELIVERY_EVENTS_FLUSH_SIZE = int(os.environ.get('DELIVERY_EVENTS_FLUSH_SIZE', '500'))
+DELIVERY_EVENTS_FLUSH_SECONDS = float(os.environ.get('DELIVERY_EVENTS_FLUSH_SECONDS', '2'))
+DELIVERY_WEBHOOK_TOKEN = os.environ.get('DELIVERY_WEBHOOK_TOKEN')
+
+# Rendered email frames (everything but the message) kept per template, occasion and image
+EMAIL_RENDER_CACHE_SIZE = int(os.environ.get('EMAIL_RENDER_CACHE_SIZE', '1024'))
+# Longest tenant email template, and longest email layout it may render to, in characters
+EMAIL_TEMPLATE_MAX_LENGTH = int(os.environ.get('EMAIL_TEMPLATE_MAX_LENGTH', '50000'))
+
+# Message provider endpoints; point both at fake_providers.py for offline load tests
+DIGITALSMS_API_URL = os.environ.get('DIGITALSMS_API_URL', 'https://demo.digitalsms.biz/api')
+BREVO_API_URL = os.environ.get('BREVO_API_URL', 'https://api.brevo.com/v3').rstrip('/')
+
+# Outbound HTTP to the message providers: one pooled client, per-provider timeouts in seconds
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+DIGITALSMS_TIMEOUT_SECONDS = float(os.environ.get('DIGITALSMS_TIMEOUT_SECONDS', '30'))
+BREVO_TIMEOUT_SECONDS = float(os.environ.get('BREVO_TIMEOUT_SECONDS', '15'))
+
+# Email reminders per Brevo call through messageVersions (1 sends each email on its own)
+BREVO_BATCH_SIZE = int(os.environ.get('BREVO_BATCH_SIZE', '100'))
+
+# Provider circuit breakers: trip on the error/slow-call rate over the last calls, probe after a pause
+CIRCUIT_BREAKER_WINDOW = int(os.environ.get('CIRCUIT_BREAKER_WINDOW', '20'))
+CIRCUIT_BREAKER_MIN_CALLS = int(os.environ.get('CIRCUIT_BREAKER_MIN_CALLS', '5'))
+CIRCUIT_BREAKER_FAILURE_RATE = float(os.environ.get('CIRCUIT_BREAKER_FAILURE_RATE', '0.5'))
+CIRCUIT_BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('CIRCUIT_BREAKER_SLOW_CALL_SECONDS', '10'))
+CIRCUIT_BREAKER_OPEN_SECONDS = float(os.environ.get('CIRCUIT_BREAKER_OPEN_SECONDS', '60'))
+CIRCUIT_BREAKER_HALF_OPEN_PROBES = int(os.environ.get('CIRCUIT_BREAKER_HALF_OPEN_PROBES', '2'))
+
+# Provider rate limits: token buckets per provider and API key ("local" per process, "mongo" across replicas)
+PROVIDER_RATE_LIMIT_BACKEND = os.environ.get('PROVIDER_RATE_LIMIT_BACKEND', 'local')
+PROVIDER_RATE_LIMITS = {
+    "digitalsms": (
+        float(os.environ.get('DIGITALSMS_RATE_PER_SECOND', '5')),
+        float(os.environ.get('DIGITALSMS_BURST', '10'))
+    ),
+    "brevo": (
+        float(os.environ.get('BREVO_RATE_PER_SECOND', '10')),
+        float(os.environ.get('BREVO_BURST', '20'))
+    )
+}
+
 # Admin Captcha Storage (in-memory, for production use Redis)
 captcha_store = {}
 
@@ -58,6 +174,8 @@ api_router = APIRouter(prefix="/api")
 
 # Security
 security = HTTPBearer()
+# For endpoints that only need a token for some of their calls
+optional_security = HTTPBearer(auto_error=False)
 
 # Models
 class UserCreate(BaseModel):
@@ -185,7 +303,34 @@ class ReminderLog(BaseModel):
     messages_sent: int = 0
     whatsapp_sent: int = 0
     email_sent: int = 0
+    messages_queued: int = 0
+    duplicates_skipped: int = 0
+    users_caught_up: int = 0  # Users whose send time had passed before this run picked them up
     errors: List[str] = []
+    stage_timings: dict = {}  # Stage -> count, total, p50, p95 and max seconds
+    queued_stage_timings: dict = {}  # Sends made later by the outbound workers: count, total, max
+    slowest_contacts: List[dict] = []
+    shard_timings: dict = {}  # Sharded runs: shard index -> stage_timings and slowest_contacts
+
+class OutboundJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    run_id: Optional[str] = None  # ReminderLog the outcome is reported to
+    user_id: str
+    contact_id: str
+    contact_name: str
+    occasion: str
+    channel: str  # "whatsapp" or "email"
+    recipient: str  # Phone number or email address
+    message: str
+    image_url: Optional[str] = None
+    charge_credit: bool = True  # Charge on delivery; False when the credit was reserved up front
+    credit_reserved: bool = False  # Refund the reserved credit if delivery finally fails
+    status: str = "pending"  # "pending", "leased", "sent" or "failed"
+    attempts: int = 0
+    available_at: str = Field(default_factory=lambda: utc_iso(datetime.now(timezone.utc)))
+    lease_expires_at: Optional[str] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class DailyReminderStats(BaseModel):
     date: str
@@ -195,6 +340,8 @@ class DailyReminderStats(BaseModel):
     whatsapp_messages: int
     email_messages: int
     errors: List[str]
+    stage_timings: dict = {}  # Day totals; p50/p95 are the worst single-run values
+    slowest_contacts: List[dict] = []
 
 class UserProfileUpdate(BaseModel):
     full_name: Optional[str] = None
@@ -217,6 +364,7 @@ class UserSettingsCreate(BaseModel):
     email_api_key: Optional[str] = None
     sender_email: Optional[str] = None
     sender_name: Optional[str] = None
+    email_html_template: Optional[str] = None  # Jinja2 layout replacing the default reminder email
     
     # Scheduling settings
     daily_send_time: Optional[str] = "09:00"  # HH:MM format
@@ -236,12 +384,15 @@ class UserSettings(BaseModel):
     email_api_key: Optional[str] = None
     sender_email: Optional[str] = None
     sender_name: Optional[str] = None
+    email_html_template: Optional[str] = None  # Jinja2 layout replacing the default reminder email
     
     # Scheduling settings
     daily_send_time: str = "09:00"
     timezone: str = "UTC"
     execution_report_enabled: bool = True
     execution_report_email: Optional[str] = None
+    next_send_at_utc: Optional[datetime] = None  # Derived from daily_send_time + timezone
+    last_completed_local_date: Optional[str] = None  # Local date of the last finished reminder run
     
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -438,6 +589,80 @@ def prepare_for_mongo(data):
                 data[key] = value.isoformat() if value.tzinfo else value.replace(tzinfo=timezone.utc).isoformat()
     return data
 
+def event_month_day(value) -> Optional[str]:
+    """Return the MM-DD key used to look up birthdays and anniversaries by day"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value).date()
+        except ValueError:
+            return None
+    return value.strftime("%m-%d")
+
+def set_contact_event_keys(contact_dict: dict) -> dict:
+    """Keep bday_md/anniv_md in sync with the birthday and anniversary_date fields"""
+    if "birthday" in contact_dict:
+        contact_dict["bday_md"] = event_month_day(contact_dict["birthday"])
+    if "anniversary_date" in contact_dict:
+        contact_dict["anniv_md"] = event_month_day(contact_dict["anniversary_date"])
+    return contact_dict
+
+def utc_iso(value: datetime) -> str:
+    """Uniform UTC ISO string (no microseconds) so stored instants compare correctly as strings"""
+    return value.astimezone(timezone.utc).replace(microsecond=0).isoformat()
+
+def compute_next_send_at(daily_send_time: Optional[str], timezone_name: Optional[str], after: datetime) -> Optional[datetime]:
+    """Next UTC instant strictly after `after` at which the user's local daily_send_time occurs"""
+    try:
+        user_tz = pytz.timezone(timezone_name or "UTC")
+        send_hour, send_minute = map(int, (daily_send_time or "09:00").split(":"))
+        local_date = after.astimezone(user_tz).date()
+        
+        # Two days ahead is always enough, the third iteration covers DST edge cases
+        for _ in range(3):
+            candidate = user_tz.localize(datetime(local_date.year, local_date.month, local_date.day, send_hour, send_minute))
+            if candidate > after:
+                return candidate.astimezone(timezone.utc)
+            local_date += timedelta(days=1)
+    except Exception:
+        return None
+    return None
+
+def due_settings_cursor(until: datetime, resume_after: Optional[tuple] = None):
+    """Settings whose next send instant is at or before `until`, in (next_send_at_utc, user_id)
+    order, starting after `resume_after` (the key of the last settings read). Scans that do
+    slow work between reads close the cursor and reopen it from there, so it cannot time out."""
+    query = {"next_send_at_utc": {"$lte": utc_iso(until)}}
+    if resume_after:
+        query = {"$and": [query, {"$or": [
+            {"next_send_at_utc": {"$gt": resume_after[0]}},
+            {"next_send_at_utc": resume_after[0], "user_id": {"$gt": resume_after[1]}}
+        ]}]}
+    return db.user_settings.find(query).sort(
+        [("next_send_at_utc", 1), ("user_id", 1)]
+    ).batch_size(MONGO_BATCH_SIZE)
+
+def reminder_claim_horizon() -> timedelta:
+    """How far past `now` a tick claims send slots. The in-process scheduler ticks every
+    SCHEDULER_TICK_SECONDS, so it only claims slots that have come; externally triggered
+    (cron) runs keep the send-window look-ahead so a slot is not missed between runs."""
+    if SCHEDULER_ENABLED:
+        return timedelta(0)
+    return timedelta(minutes=REMINDER_SEND_WINDOW_MINUTES)
+
+def reminder_slot_is_due(settings: dict, slot: datetime, now: datetime) -> bool:
+    """Catch-up rule: a send slot is still worth running while it falls on the user's current
+    local day (or later) and that local day has no completed run yet"""
+    try:
+        user_tz = pytz.timezone(settings.get("timezone") or "UTC")
+    except Exception:
+        user_tz = pytz.UTC
+    slot_date = slot.astimezone(user_tz).date().isoformat()
+    if slot_date < now.astimezone(user_tz).date().isoformat():
+        return False
+    return (settings.get("last_completed_local_date") or "") < slot_date
+
 def parse_from_mongo(item):
     if isinstance(item, dict):
         # Handle MongoDB ObjectId conversion
@@ -599,7 +824,7 @@ async def create_contact(contact_data: ContactCreate, current_user: User = Depen
         **contact_data.dict()
     )
     
-    contact_dict = prepare_for_mongo(contact.dict())
+    contact_dict = set_contact_event_keys(prepare_for_mongo(contact.dict()))
     await db.contacts.insert_one(contact_dict)
     
     return contact
@@ -622,7 +847,7 @@ async def update_contact(contact_id: str, contact_data: ContactCreate, current_u
     if not contact:
         raise HTTPException(status_code=404, detail="Contact not found")
     
-    update_data = prepare_for_mongo(contact_data.dict(exclude_unset=True))
+    update_data = set_contact_event_keys(prepare_for_mongo(contact_data.dict(exclude_unset=True)))
     await db.contacts.update_one({"id": contact_id}, {"$set": update_data})
     
     updated_contact = await db.contacts.find_one({"id": contact_id})
@@ -680,10 +905,18 @@ async def bulk_upload_contacts(
                 detail=f"Missing required columns: {', '.join(missing_columns)}. Expected columns: name, birthday, anniversary, email, whatsapp"
             )
         
-        # Get existing contacts for duplicate checking
-        existing_contacts = await db.contacts.find({"user_id": current_user.id}).to_list(1000)
-        existing_emails = {contact.get('email', '').lower() for contact in existing_contacts if contact.get('email')}
-        existing_whatsapp = {contact.get('whatsapp', '') for contact in existing_contacts if contact.get('whatsapp')}
+        # Get existing contacts for duplicate checking (streamed, only the fields compared)
+        existing_emails = set()
+        existing_whatsapp = set()
+        existing_contacts = db.contacts.find(
+            {"user_id": current_user.id},
+            {"email": 1, "whatsapp": 1}
+        ).batch_size(MONGO_BATCH_SIZE)
+        async for contact in existing_contacts:
+            if contact.get('email'):
+                existing_emails.add(contact['email'].lower())
+            if contact.get('whatsapp'):
+                existing_whatsapp.add(contact['whatsapp'])
         
         # Process rows
         successful_imports = []
@@ -818,7 +1051,7 @@ async def bulk_upload_contacts(
                     existing_whatsapp.add(whatsapp)
                 
                 # Save to database
-                contact_dict = prepare_for_mongo(contact.dict())
+                contact_dict = set_contact_event_keys(prepare_for_mongo(contact.dict()))
                 await db.contacts.insert_one(contact_dict)
                 
                 successful_imports.append(contact)
@@ -878,67 +1111,72 @@ async def delete_template(template_id: str, current_user: User = Depends(get_cur
     return {"message": "Template deleted successfully"}
 
 # Enhanced AI Message Generation with Tone Variations
+async def generate_llm_message(request: GenerateMessageRequest, user_id: str) -> str:
+    """Generate an occasion message with the LLM; raises when generation fails"""
+    # Tone-specific system messages and prompts
+    tone_configs = {
+        "normal": {
+            "system": "You are a friendly assistant that generates warm, heartfelt messages for special occasions.",
+            "style": "warm and friendly"
+        },
+        "business": {
+            "system": "You are a professional assistant that generates polite, respectful business messages.",
+            "style": "professional and courteous"
+        },
+        "formal": {
+            "system": "You are a formal assistant that generates elegant, sophisticated messages.",
+            "style": "formal and respectful"
+        },
+        "informal": {
+            "system": "You are a casual assistant that generates relaxed, friendly messages.",
+            "style": "casual and relaxed"
+        },
+        "funny": {
+            "system": "You are a humorous assistant that generates light-hearted, amusing messages while staying appropriate.",
+            "style": "funny and entertaining"
+        },
+        "casual": {
+            "system": "You are a laid-back assistant that generates easy-going, casual messages.",
+            "style": "casual and easy-going"
+        }
+    }
+    
+    tone_config = tone_configs.get(request.tone, tone_configs["normal"])
+    
+    # Initialize LLM chat with tone-specific system message
+    chat = LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=f"user_{user_id}_message_gen_{request.tone}",
+        system_message=tone_config["system"]
+    ).with_model(*MESSAGE_LLM_MODEL)
+    
+    # Create tone-specific prompt
+    prompt = f"Generate a {tone_config['style']} {request.occasion} message for {request.contact_name}. "
+    prompt += f"The relationship is: {request.relationship}. "
+    prompt += f"Make it {tone_config['style']} and appropriate for the occasion. "
+    
+    if request.tone == "funny":
+        prompt += "Include some light humor but keep it tasteful and appropriate. "
+    elif request.tone == "business":
+        prompt += "Keep it professional yet warm, suitable for a business relationship. "
+    elif request.tone == "formal":
+        prompt += "Use elegant language and formal expressions. "
+    elif request.tone == "informal":
+        prompt += "Use casual language and be conversational. "
+    elif request.tone == "casual":
+        prompt += "Keep it simple, laid-back, and easy-going. "
+    
+    prompt += "Keep it between 30-100 words. Do not include greetings like 'Dear' or signatures."
+    
+    user_message = UserMessage(text=prompt)
+    response = await chat.send_message(user_message)
+    
+    return response
+
 @api_router.post("/generate-message", response_model=MessageResponse)
 async def generate_message(request: GenerateMessageRequest, current_user: User = Depends(get_current_user)):
     try:
-        # Tone-specific system messages and prompts
-        tone_configs = {
-            "normal": {
-                "system": "You are a friendly assistant that generates warm, heartfelt messages for special occasions.",
-                "style": "warm and friendly"
-            },
-            "business": {
-                "system": "You are a professional assistant that generates polite, respectful business messages.",
-                "style": "professional and courteous"
-            },
-            "formal": {
-                "system": "You are a formal assistant that generates elegant, sophisticated messages.",
-                "style": "formal and respectful"
-            },
-            "informal": {
-                "system": "You are a casual assistant that generates relaxed, friendly messages.",
-                "style": "casual and relaxed"
-            },
-            "funny": {
-                "system": "You are a humorous assistant that generates light-hearted, amusing messages while staying appropriate.",
-                "style": "funny and entertaining"
-            },
-            "casual": {
-                "system": "You are a laid-back assistant that generates easy-going, casual messages.",
-                "style": "casual and easy-going"
-            }
-        }
-        
-        tone_config = tone_configs.get(request.tone, tone_configs["normal"])
-        
-        # Initialize LLM chat with tone-specific system message
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"user_{current_user.id}_message_gen_{request.tone}",
-            system_message=tone_config["system"]
-        ).with_model("openai", "gpt-4o")
-        
-        # Create tone-specific prompt
-        prompt = f"Generate a {tone_config['style']} {request.occasion} message for {request.contact_name}. "
-        prompt += f"The relationship is: {request.relationship}. "
-        prompt += f"Make it {tone_config['style']} and appropriate for the occasion. "
-        
-        if request.tone == "funny":
-            prompt += "Include some light humor but keep it tasteful and appropriate. "
-        elif request.tone == "business":
-            prompt += "Keep it professional yet warm, suitable for a business relationship. "
-        elif request.tone == "formal":
-            prompt += "Use elegant language and formal expressions. "
-        elif request.tone == "informal":
-            prompt += "Use casual language and be conversational. "
-        elif request.tone == "casual":
-            prompt += "Keep it simple, laid-back, and easy-going. "
-        
-        prompt += "Keep it between 30-100 words. Do not include greetings like 'Dear' or signatures."
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
+        response = await generate_llm_message(request, current_user.id)
         return MessageResponse(message=response)
         
     except Exception as e:
@@ -1016,8 +1254,11 @@ async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
     today = date.today()
     upcoming_events = []
     
-    contacts = await db.contacts.find({"user_id": current_user.id}).to_list(1000)
-    for contact in contacts:
+    contacts = db.contacts.find(
+        {"user_id": current_user.id},
+        {"name": 1, "birthday": 1, "anniversary_date": 1}
+    ).batch_size(MONGO_BATCH_SIZE)
+    async for contact in contacts:
         contact = parse_from_mongo(contact)
         if contact.get('birthday'):
             birthday = contact['birthday']
@@ -1067,14 +1308,24 @@ async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
 # Admin Routes
 @api_router.get("/admin/dashboard", response_model=AdminDashboardStats)
 async def get_admin_dashboard(admin_user: User = Depends(get_admin_user)):
-    # Get all users
-    users = await db.users.find().to_list(10000)
-    
-    # Calculate stats
-    total_users = len(users)
-    active_subscriptions = len([u for u in users if u.get('subscription_status') == 'active'])
-    trial_users = len([u for u in users if u.get('subscription_status') == 'trial'])
-    expired_users = len([u for u in users if u.get('subscription_status') in ['expired', 'cancelled']])
+    # Stream all users, counting as we go (only the fields the stats need)
+    thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
+    total_users = active_subscriptions = trial_users = expired_users = recent_signups = 0
+    
+    users = db.users.find({}, {"subscription_status": 1, "created_at": 1}).batch_size(MONGO_BATCH_SIZE)
+    async for u in users:
+        total_users += 1
+        subscription_status = u.get('subscription_status')
+        if subscription_status == 'active':
+            active_subscriptions += 1
+        elif subscription_status == 'trial':
+            trial_users += 1
+        elif subscription_status in ['expired', 'cancelled']:
+            expired_users += 1
+        
+        # Recent signups (last 30 days)
+        if datetime.fromisoformat(u.get('created_at', '2020-01-01T00:00:00+00:00')) > thirty_days_ago:
+            recent_signups += 1
     
     # Get total contacts and templates
     total_contacts = await db.contacts.count_documents({})
@@ -1083,10 +1334,6 @@ async def get_admin_dashboard(admin_user: User = Depends(get_admin_user)):
     # Calculate revenue (assuming $9.99 per active subscription)
     monthly_revenue = active_subscriptions * 9.99
     
-    # Recent signups (last 30 days)
-    thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
-    recent_signups = len([u for u in users if datetime.fromisoformat(u.get('created_at', '2020-01-01T00:00:00+00:00')) > thirty_days_ago])
-    
     # Simple churn rate calculation (expired/cancelled out of total)
     churn_rate = (expired_users / total_users * 100) if total_users > 0 else 0.0
     
@@ -1248,6 +1495,45 @@ async def make_user_admin(user_email: str):
     
     return {"message": f"User {user_email} is now an admin"}
 
+# Settings Cache
+class SettingsCache:
+    """user_settings documents by user id for the send path. `settings_cache` is the
+    process-wide instance; a reminder run keeps its own, filled from the documents it
+    claims, so its sends never read user_settings again."""
+    
+    def __init__(self, ttl: Optional[float] = SETTINGS_CACHE_TTL_SECONDS, max_entries: int = SETTINGS_CACHE_MAX_USERS):
+        self.ttl = ttl  # None keeps entries for the cache's lifetime
+        self.max_entries = max_entries
+        self.entries = {}  # user_id -> (expires_at, settings)
+    
+    async def get(self, user_id: str) -> Optional[dict]:
+        entry = self.entries.get(user_id)
+        if entry and (entry[0] is None or entry[0] > time.monotonic()):
+            return entry[1]
+        
+        settings = await db.user_settings.find_one({"user_id": user_id})
+        if settings:
+            self.put(settings)
+        return settings
+    
+    def put(self, settings: dict):
+        if len(self.entries) >= self.max_entries and settings["user_id"] not in self.entries:
+            now = time.monotonic()
+            for user_id in [key for key, (expires_at, _) in self.entries.items() if expires_at is not None and expires_at <= now]:
+                del self.entries[user_id]
+            if len(self.entries) >= self.max_entries:
+                del self.entries[next(iter(self.entries))]  # Oldest entry
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.entries[settings["user_id"]] = (expires_at, settings)
+    
+    def invalidate(self, user_id: Optional[str] = None):
+        if user_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(user_id, None)
+
+settings_cache = SettingsCache()
+
 # User Settings Routes
 @api_router.get("/settings", response_model=UserSettings)
 async def get_user_settings(current_user: User = Depends(get_current_user)):
@@ -1259,7 +1545,12 @@ async def get_user_settings(current_user: User = Depends(get_current_user)):
             user_id=current_user.id,
             execution_report_email=current_user.email
         )
+        default_settings.next_send_at_utc = compute_next_send_at(
+            default_settings.daily_send_time, default_settings.timezone, datetime.now(timezone.utc)
+        )
         settings_dict = prepare_for_mongo(default_settings.dict())
+        if default_settings.next_send_at_utc:
+            settings_dict["next_send_at_utc"] = utc_iso(default_settings.next_send_at_utc)
         await db.user_settings.insert_one(settings_dict)
         return default_settings
     
@@ -1267,6 +1558,19 @@ async def get_user_settings(current_user: User = Depends(get_current_user)):
 
 @api_router.put("/settings", response_model=UserSettings)
 async def update_user_settings(settings_data: UserSettingsCreate, current_user: User = Depends(get_current_user)):
+    # Validate scheduling fields up front, they drive next_send_at_utc
+    if settings_data.timezone is not None and settings_data.timezone not in pytz.all_timezones_set:
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {settings_data.timezone}")
+    
+    if settings_data.daily_send_time is not None and not re.match(r'^([01]\d|2[0-3]):[0-5]\d$', settings_data.daily_send_time):
+        raise HTTPException(status_code=400, detail="Daily send time must be in HH:MM format")
+    
+    if settings_data.email_html_template:
+        try:
+            email_frame(settings_data.email_html_template, "birthday", None)
+        except (TemplateError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid email template: {str(e)}")
+    
     # Update timestamp
     update_data = settings_data.dict(exclude_unset=True)
     update_data["updated_at"] = datetime.now(timezone.utc)
@@ -1285,8 +1589,16 @@ async def update_user_settings(settings_data: UserSettingsCreate, current_user:
         upsert=True
     )
     
-    # Fetch updated settings
+    # Fetch updated settings and recompute when the next daily run is due
     settings = await db.user_settings.find_one({"user_id": current_user.id})
+    next_send_at = compute_next_send_at(settings.get("daily_send_time"), settings.get("timezone"), datetime.now(timezone.utc))
+    settings["next_send_at_utc"] = utc_iso(next_send_at) if next_send_at else None
+    await db.user_settings.update_one(
+        {"user_id": current_user.id},
+        {"$set": {"next_send_at_utc": settings["next_send_at_utc"]}, "$unset": {"pending_slot_utc": "", "pending_run_id": ""}}
+    )
+    settings_cache.invalidate(current_user.id)
+    
     return UserSettings(**parse_from_mongo(settings))
 
 @api_router.post("/settings/test-whatsapp")
@@ -1328,7 +1640,8 @@ async def test_whatsapp_config(current_user: User = Depends(get_current_user)):
             user_id=current_user.id,
             phone_number=user_phone,
             message=test_message,
-            occasion="birthday"  # Default for test messages
+            occasion="birthday",  # Default for test messages
+            settings=settings
         )
         
         if result["status"] == "success":
@@ -1361,13 +1674,11 @@ async def test_email_config(current_user: User = Depends(get_current_user)):
     
     # Test Brevo API configuration
     try:
-        import requests
-        
         api_key = settings["email_api_key"]
         sender_email = settings["sender_email"]
         sender_name = settings.get("sender_name", "ReminderAI")
         
-        url = "https://api.brevo.com/v3/smtp/email"
+        url = f"{BREVO_API_URL}/smtp/email"
         headers = {
             "api-key": api_key,
             "Content-Type": "application/json"
@@ -1389,7 +1700,7 @@ async def test_email_config(current_user: User = Depends(get_current_user)):
             "htmlContent": "<html><body><h2>Email Configuration Test</h2><p>Your email API configuration is working correctly!</p><p>This is a test email to verify your Brevo API setup.</p></body></html>"
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = await provider_request("brevo", api_key, "POST", url, json=payload, headers=headers)
         
         if response.status_code == 201:
             return {"status": "success", "message": "Email API configuration is valid and test email sent"}
@@ -1474,24 +1785,347 @@ def ensure_absolute_image_url(image_url: Optional[str]) -> Optional[str]:
     # If it's a relative path without leading /, assume it's in uploads/images/
     return f"{BACKEND_URL}/uploads/images/{image_url}"
 
+# Outbound HTTP Client
+PROVIDER_TIMEOUTS = {
+    "digitalsms": httpx.Timeout(DIGITALSMS_TIMEOUT_SECONDS, connect=5.0),
+    "brevo": httpx.Timeout(BREVO_TIMEOUT_SECONDS, connect=5.0)
+}
+
+http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Application-wide pooled client; created by the startup hook, or lazily for CLI runs"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        try:
+            import h2  # noqa: F401 - HTTP/2 needs the optional h2 package
+            http2 = True
+        except ImportError:
+            http2 = False
+        http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
+    return http_client
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+# Provider Rate Limiting
+class TokenBucket:
+    """In-process token bucket; tokens may go negative to push back after a 429"""
+    
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    async def acquire(self):
+        # The lock queues waiters so tokens are handed out first come, first served
+        async with self.lock:
+            while True:
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    async def penalize(self, seconds: float):
+        self.refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+class MongoTokenBucket:
+    """Token bucket kept in db.rate_limits so every replica draws from the same budget.
+    Updates are compare-and-set on updated_at; losers re-read and try again."""
+    
+    def __init__(self, bucket_id: str, rate: float, burst: float):
+        self.bucket_id = bucket_id
+        self.rate = rate
+        self.burst = burst
+    
+    async def update(self, penalty_seconds: Optional[float] = None):
+        """Take one token, waiting for it; with `penalty_seconds`, drain the bucket instead"""
+        while True:
+            now = time.time()
+            bucket = await db.rate_limits.find_one({"_id": self.bucket_id})
+            if not bucket:
+                try:
+                    await db.rate_limits.insert_one({"_id": self.bucket_id, "tokens": self.burst, "updated_at": now})
+                except DuplicateKeyError:
+                    pass
+                continue
+            
+            tokens = min(self.burst, bucket["tokens"] + (now - bucket["updated_at"]) * self.rate)
+            if penalty_seconds is not None:
+                tokens = min(tokens, 0) - penalty_seconds * self.rate
+            elif tokens < 1:
+                await asyncio.sleep((1 - tokens) / self.rate)
+                continue
+            else:
+                tokens -= 1
+            
+            updated = await db.rate_limits.update_one(
+                {"_id": self.bucket_id, "updated_at": bucket["updated_at"]},
+                {"$set": {"tokens": tokens, "updated_at": now}}
+            )
+            if updated.modified_count:
+                return
+    
+    async def acquire(self):
+        await self.update()
+    
+    async def penalize(self, seconds: float):
+        await self.update(penalty_seconds=seconds)
+
+def provider_key_id(provider: str, api_key: str) -> str:
+    """Identifies a provider/API key pair without keeping the key itself"""
+    return f"{provider}:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}"
+
+class ProviderRateLimiter:
+    """Token buckets keyed by provider and tenant API key (the key itself is only stored hashed)"""
+    
+    def __init__(self, limits: dict, backend: str = "local"):
+        self.limits = limits
+        self.backend = backend
+        self.buckets = {}
+    
+    def bucket(self, provider: str, api_key: str):
+        rate, burst = self.limits[provider]
+        bucket_id = provider_key_id(provider, api_key)
+        if bucket_id not in self.buckets:
+            if self.backend == "mongo":
+                self.buckets[bucket_id] = MongoTokenBucket(bucket_id, rate, burst)
+            else:
+                self.buckets[bucket_id] = TokenBucket(rate, burst)
+        return self.buckets[bucket_id]
+    
+    async def acquire(self, provider: str, api_key: str):
+        """Wait until the provider/API key pair may make another request"""
+        rate, _ = self.limits.get(provider, (0, 0))
+        if rate > 0:
+            await self.bucket(provider, api_key).acquire()
+    
+    async def penalize(self, provider: str, api_key: str, seconds: float = 1.0):
+        """Hold back further requests after the provider answered 429 Too Many Requests"""
+        rate, _ = self.limits.get(provider, (0, 0))
+        if rate > 0:
+            await self.bucket(provider, api_key).penalize(seconds)
+
+provider_rate_limiter = ProviderRateLimiter(PROVIDER_RATE_LIMITS, PROVIDER_RATE_LIMIT_BACKEND)
+
+def retry_after_seconds(response) -> float:
+    try:
+        return float(response.headers.get("Retry-After", 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+def is_retryable_status(status_code) -> bool:
+    """Only timeouts, throttling and server errors are worth retrying; client errors (bad
+    request, invalid key, proxy authentication, ...) and missing or unknown codes are not.
+    A request that failed without any response is retried by the caller's exception path."""
+    try:
+        code = int(status_code)
+    except (TypeError, ValueError):
+        return False
+    return code in (408, 429) or 500 <= code < 600
+
+# Provider Circuit Breakers
+PROVIDER_LABELS = {"digitalsms": "DigitalSMS", "brevo": "Brevo"}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider/API key whose circuit is open"""
+    
+    def __init__(self, provider: str, retry_at: float):
+        self.provider = provider
+        self.retry_at = retry_at  # Epoch seconds when a probe may be tried
+        super().__init__(f"{PROVIDER_LABELS.get(provider, provider)} is failing, sends are paused (circuit open)")
+
+class CircuitBreaker:
+    """Closed: calls pass and outcomes are tracked over a sliding window. Open: calls fail
+    fast for a cooldown. Half-open: a few probe calls decide between closed and open."""
+    
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.state = "closed"
+        self.outcomes = deque(maxlen=CIRCUIT_BREAKER_WINDOW)  # (failed, seconds)
+        self.opened_at: Optional[float] = None
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.half_open_generation = 0  # Counts half-open periods, so late probes are recognised
+        self.last_failure: Optional[str] = None
+    
+    @property
+    def retry_at(self) -> float:
+        return (self.opened_at or time.time()) + CIRCUIT_BREAKER_OPEN_SECONDS
+    
+    def before_call(self) -> Optional[int]:
+        """Raise CircuitOpenError unless a call may go through now. A call admitted as a
+        half-open probe gets the period's generation, to be passed back to record()."""
+        if self.state == "open":
+            if time.time() < self.retry_at:
+                raise CircuitOpenError(self.provider, self.retry_at)
+            self.state = "half_open"
+            self.half_open_generation += 1
+            self.probes_in_flight = 0
+            self.probe_successes = 0
+        
+        if self.state == "half_open":
+            if self.probes_in_flight >= CIRCUIT_BREAKER_HALF_OPEN_PROBES:
+                raise CircuitOpenError(self.provider, time.time() + 1)
+            self.probes_in_flight += 1
+            return self.half_open_generation
+        return None
+    
+    def record(self, failed: bool, seconds: float, failure: Optional[str] = None, probe: Optional[int] = None):
+        failed = failed or seconds >= CIRCUIT_BREAKER_SLOW_CALL_SECONDS
+        if failed:
+            self.last_failure = failure or f"slow call ({seconds:.1f}s)"
+        
+        # A call counts only toward the state it was admitted in: probes toward their own
+        # half-open period, other calls toward the closed window
+        if probe is not None:
+            if self.state != "half_open" or probe != self.half_open_generation:
+                return
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            if failed:
+                self.trip()
+                return
+            self.probe_successes += 1
+            if self.probe_successes >= CIRCUIT_BREAKER_HALF_OPEN_PROBES:
+                logger.info(f"{PROVIDER_LABELS.get(self.provider, self.provider)} circuit closed")
+                self.state = "closed"
+                self.outcomes.clear()
+            return
+        
+        if self.state != "closed":
+            return
+        self.outcomes.append((failed, seconds))
+        if len(self.outcomes) >= CIRCUIT_BREAKER_MIN_CALLS:
+            if self.failure_rate() >= CIRCUIT_BREAKER_FAILURE_RATE:
+                self.trip()
+    
+    def release(self, probe: Optional[int]):
+        """Give back the slot of a probe that ended without an outcome (cancelled, or failed
+        before reaching the provider), so the half-open period can admit another"""
+        if probe is not None and self.state == "half_open" and probe == self.half_open_generation:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+    
+    def trip(self):
+        logger.warning(f"{PROVIDER_LABELS.get(self.provider, self.provider)} circuit opened: {self.last_failure}")
+        self.state = "open"
+        self.opened_at = time.time()
+    
+    def failure_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for failed, _ in self.outcomes if failed) / len(self.outcomes)
+    
+    def snapshot(self) -> dict:
+        latencies = sorted(seconds for _, seconds in self.outcomes)
+        return {
+            "state": self.state,
+            "calls": len(self.outcomes),
+            "failure_rate": round(self.failure_rate(), 3),
+            "p95_latency_seconds": round(percentile(latencies, 0.95), 3) if latencies else None,
+            "last_failure": self.last_failure,
+            "retry_at": datetime.fromtimestamp(self.retry_at, timezone.utc).isoformat() if self.state != "closed" else None
+        }
+
+class ProviderCircuitBreakers:
+    """Circuit breakers keyed by provider and tenant API key, kept per process"""
+    
+    def __init__(self):
+        self.breakers = {}
+    
+    def get(self, provider: str, api_key: str) -> CircuitBreaker:
+        key_id = provider_key_id(provider, api_key)
+        if key_id not in self.breakers:
+            self.breakers[key_id] = CircuitBreaker(provider)
+        return self.breakers[key_id]
+    
+    def snapshot(self) -> list:
+        return [
+            {"provider": breaker.provider, "key": key_id.split(":", 1)[1], **breaker.snapshot()}
+            for key_id, breaker in self.breakers.items()
+        ]
+
+circuit_breakers = ProviderCircuitBreakers()
+
+async def provider_request(provider: str, api_key: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Call a provider through its circuit breaker, rate limiter and the shared HTTP client.
+    Transport errors, 5xx, 429 and slow calls count as failures; other 4xx are the tenant's problem."""
+    breaker = circuit_breakers.get(provider, api_key)
+    probe = breaker.before_call()
+    recorded = False
+    try:
+        await provider_rate_limiter.acquire(provider, api_key)
+        
+        started = time.perf_counter()
+        try:
+            response = await get_http_client().request(method, url, timeout=PROVIDER_TIMEOUTS[provider], **kwargs)
+        except Exception as e:
+            recorded = True
+            breaker.record(True, time.perf_counter() - started, f"{type(e).__name__}: {str(e)}", probe)
+            raise
+        
+        failed = response.status_code == 429 or response.status_code >= 500
+        recorded = True
+        breaker.record(failed, time.perf_counter() - started, f"HTTP {response.status_code}" if failed else None, probe)
+    finally:
+        # A rate limiter error or cancellation must not keep the probe slot forever
+        if not recorded:
+            breaker.release(probe)
+    if response.status_code == 429:
+        await provider_rate_limiter.penalize(provider, api_key, retry_after_seconds(response))
+    return response
+
+def circuit_open_result(error: CircuitOpenError) -> dict:
+    """Send result for a fast-failed call; retry_at lets the outbound queue defer the job"""
+    return {
+        "status": "error",
+        "message": str(error),
+        "retry_at": utc_iso(datetime.fromtimestamp(error.retry_at, timezone.utc))
+    }
+
 # WhatsApp Message Sending Functions
-async def send_whatsapp_message(user_id: str, phone_number: str, message: str, image_url: Optional[str] = None, occasion: str = "birthday"):
-    """Send WhatsApp message using DigitalSMS API according to official documentation"""
-    settings = await db.user_settings.find_one({"user_id": user_id})
+async def send_whatsapp_message(
+    user_id: str,
+    phone_number: str,
+    message: str,
+    image_url: Optional[str] = None,
+    occasion: str = "birthday",
+    settings: Optional[dict] = None
+):
+    """Send WhatsApp message using DigitalSMS API according to official documentation.
+    Pass the user's settings document when it is already loaded; otherwise it comes from settings_cache."""
+    if settings is None:
+        settings = await settings_cache.get(user_id)
     
     if not settings:
         return {"status": "error", "message": "No WhatsApp configuration found"}
     
     try:
-        import requests
-        
         api_key = settings.get("digitalsms_api_key")
         
         if not api_key:
             return {"status": "error", "message": "DigitalSMS API key not configured"}
         
         # DigitalSMS API endpoint as per documentation
-        url = "https://demo.digitalsms.biz/api"
+        url = DIGITALSMS_API_URL
         
         # Clean phone number - DigitalSMS expects 10-digit Indian mobile number
         clean_phone = phone_number.replace("+91", "").replace("+", "").replace(" ", "").replace("-", "")
@@ -1522,7 +2156,7 @@ async def send_whatsapp_message(user_id: str, phone_number: str, message: str, i
         print(f"DigitalSMS API Request - URL: {url}, Params: {debug_params}")
         
         # Make API request (GET method as per documentation)
-        response = requests.get(url, params=params, timeout=30)
+        response = await provider_request("digitalsms", api_key, "GET", url, params=params)
         
         # Log response for debugging
         print(f"DigitalSMS API Response - Status: {response.status_code}, Body: {response.text[:200]}...")
@@ -1536,7 +2170,12 @@ async def send_whatsapp_message(user_id: str, phone_number: str, message: str, i
                 statuscode = response_data.get("statuscode", "")
                 
                 if status == 1:
-                    return {"status": "success", "message": f"Message sent successfully. Response: {message_text}"}
+                    result = {"status": "success", "message": f"Message sent successfully. Response: {message_text}"}
+                    # Delivery reports refer back to this id
+                    provider_message_id = response_data.get("requestid") or response_data.get("msgid")
+                    if provider_message_id:
+                        result["message_id"] = str(provider_message_id)
+                    return result
                 else:
                     # Provide specific error messages for common issues
                     if statuscode == 403:
@@ -1548,7 +2187,7 @@ async def send_whatsapp_message(user_id: str, phone_number: str, message: str, i
                     else:
                         error_msg = f"DigitalSMS API error (Code: {statuscode}): {message_text}"
                     
-                    return {"status": "error", "message": error_msg}
+                    return {"status": "error", "message": error_msg, "retryable": is_retryable_status(statuscode)}
                     
             except json.JSONDecodeError:
                 # Fallback to text response parsing
@@ -1563,10 +2202,16 @@ async def send_whatsapp_message(user_id: str, phone_number: str, message: str, i
                     # If response is unclear, assume success if HTTP 200
                     return {"status": "success", "message": f"Message sent via DigitalSMS API. Server response: {response_text}"}
         else:
-            return {"status": "error", "message": f"DigitalSMS API HTTP error {response.status_code}: {response.text} | Debug: {debug_params}"}
-            
+            return {
+                "status": "error",
+                "message": f"DigitalSMS API HTTP error {response.status_code}: {response.text} | Debug: {debug_params}",
+                "retryable": is_retryable_status(response.status_code)
+            }
+    
+    except CircuitOpenError as e:
+        return circuit_open_result(e)
     except Exception as e:
-        return {"status": "error", "message": f"WhatsApp sending error: {str(e)}"}
+        return {"status": "error", "message": f"WhatsApp sending error: {str(e)}", "retryable": True}
 
 @api_router.post("/send-whatsapp-test")
 async def send_test_whatsapp_message(phone_number: str, current_user: User = Depends(get_current_user)):
@@ -1795,90 +2440,68 @@ async def send_test_message(request: TestMessageRequest, current_user: User = De
             (email_template.get("email_image_url") if email_template else None)
         )
     
-    # Send test WhatsApp message to user's phone (if they have WhatsApp configured and phone number in their profile)
-    if contact.get("whatsapp"):
+    async def send_test_whatsapp() -> Optional[dict]:
+        # Send test WhatsApp message to user's phone (if they have WhatsApp configured and phone number in their profile)
+        if not contact.get("whatsapp"):
+            return None
+        
         test_whatsapp_message = f"🧪 TEST MESSAGE for {contact['name']}'s {request.occasion}:\n\n{whatsapp_message}\n\n📝 This is how your message will appear."
         
-        whatsapp_result = await send_whatsapp_message(
+        return await send_whatsapp_message(
             user_id=current_user.id,
             phone_number=contact["whatsapp"],
             message=test_whatsapp_message,
             image_url=whatsapp_image,
-            occasion=request.occasion
+            occasion=request.occasion,
+            settings=settings
         )
-        results["whatsapp"] = whatsapp_result
     
-    # Send test email to user's email
-    if settings and settings.get("email_api_key"):
-        import requests
+    async def send_test_email() -> dict:
+        # Send test email to user's email
+        if not settings or not settings.get("email_api_key"):
+            return {"status": "error", "message": "Email API not configured"}
         
         try:
             api_key = settings.get("email_api_key")
             sender_email = settings.get("sender_email")
             sender_name = settings.get("sender_name", "ReminderAI")
             
-            url = "https://api.brevo.com/v3/smtp/email"
+            url = f"{BREVO_API_URL}/smtp/email"
             headers = {
                 "api-key": api_key,
                 "Content-Type": "application/json"
             }
             
-            # Convert email image to absolute URL
-            absolute_email_image = ensure_absolute_image_url(email_image)
-            if not absolute_email_image:
-                absolute_email_image = get_default_celebration_image(request.occasion)
-            
-            # Create HTML email content
-            html_content = f"""
-            <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <h2 style="color: #e11d48; border-bottom: 2px solid #e11d48; padding-bottom: 10px;">
-                        🧪 Test Message Preview
-                    </h2>
-                    <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                        <h3 style="margin-top: 0; color: #374151;">
-                            {contact['name']}'s {request.occasion.title()} Message:
-                        </h3>
-                        <div style="background-color: white; padding: 15px; border-radius: 6px; border-left: 4px solid #e11d48;">
-                            {email_message}
-                        </div>
-                        {f'<img src="{absolute_email_image}" style="max-width: 100%; height: auto; margin-top: 15px; border-radius: 6px;" alt="Celebration Image">' if absolute_email_image else ''}
-                    </div>
-                    <p style="font-size: 14px; color: #6b7280; margin-top: 30px;">
-                        📝 This is a preview of how your {request.occasion} message will appear when sent to {contact['name']}.
-                    </p>
-                </div>
-            </body>
-            </html>
-            """
+            # The preview is the exact email the contact will get, sent to the user instead
+            email = build_email_reminder(
+                {"email": current_user.email, "name": current_user.full_name},
+                request.occasion,
+                email_message,
+                email_image,
+                settings.get("email_html_template")
+            )
             
             payload = {
                 "sender": {
                     "name": sender_name,
                     "email": sender_email
                 },
-                "to": [
-                    {
-                        "email": current_user.email,
-                        "name": current_user.full_name
-                    }
-                ],
+                "to": email["to"],
                 "subject": f"Test: {contact['name']}'s {request.occasion.title()} Message Preview",
-                "htmlContent": html_content
+                "htmlContent": email["htmlContent"]
             }
             
-            response = requests.post(url, json=payload, headers=headers)
+            response = await provider_request("brevo", api_key, "POST", url, json=payload, headers=headers)
             
             if response.status_code == 201:
-                results["email"] = {"status": "success", "message": "Test email sent successfully"}
-            else:
-                results["email"] = {"status": "error", "message": f"Email API error: {response.text}"}
+                return {"status": "success", "message": "Test email sent successfully"}
+            return {"status": "error", "message": f"Email API error: {response.text}"}
                 
         except Exception as e:
-            results["email"] = {"status": "error", "message": f"Email test error: {str(e)}"}
-    else:
-        results["email"] = {"status": "error", "message": "Email API not configured"}
+            return {"status": "error", "message": f"Email test error: {str(e)}"}
+    
+    # Both channels are sent at the same time
+    results["whatsapp"], results["email"] = await asyncio.gather(send_test_whatsapp(), send_test_email())
     
     return {
         "contact_name": contact["name"],
@@ -1970,127 +2593,469 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
-
-# Daily Reminder System
-async def get_contact_message_for_reminder(user_id: str, contact_id: str, occasion: str):
-    """Get appropriate message and image for reminder with hierarchy logic"""
+async def ensure_indexes():
+    """Create the indexes the daily reminder run relies on"""
+    await db.contacts.create_index([("user_id", 1), ("bday_md", 1)])
+    await db.contacts.create_index([("user_id", 1), ("anniv_md", 1)])
+    await db.user_settings.create_index("user_id")
+    await db.user_settings.create_index([("next_send_at_utc", 1), ("user_id", 1)])
+    await db.outbound_jobs.create_index([("status", 1), ("available_at", 1)])
+    await db.outbound_jobs.create_index([("status", 1), ("lease_expires_at", 1)])
+    await db.outbound_jobs.create_index([("user_id", 1), ("channel", 1), ("status", 1)])
+    await db.outbound_jobs.create_index("id")
+    await db.sent_ledger.create_index(
+        [("user_id", 1), ("contact_id", 1), ("occasion", 1), ("channel", 1), ("local_date", 1)],
+        unique=True
+    )
+    await db.sent_ledger.create_index("expires_at", expireAfterSeconds=0)
+    
+    await db.dead_letters.create_index("id", unique=True)
+    await db.dead_letters.create_index([("replayed_at", 1), ("dead_lettered_at", -1)])
+    await db.delivery_status.create_index([("provider", 1), ("message_id", 1)], unique=True)
+    await db.delivery_status.create_index([("user_id", 1), ("channel", 1), ("status", 1)])
+    await db.pregenerated_messages.create_index(
+        [("user_id", 1), ("contact_id", 1), ("occasion", 1), ("message_type", 1), ("event_date", 1)],
+        unique=True
+    )
+    await db.pregenerated_messages.create_index("expires_at", expireAfterSeconds=0)
     
-    # Get template defaults for fallback images
-    whatsapp_template = await db.templates.find_one({
-        "user_id": user_id,
-        "type": "whatsapp",
-        "is_default": True
-    })
+    await db.reminder_logs.create_index([("date", -1), ("execution_time", -1)])
     
-    email_template = await db.templates.find_one({
-        "user_id": user_id,
-        "type": "email", 
-        "is_default": True
-    })
+    # Runs, shards and queue workers upsert logs by id concurrently; uniqueness keeps it one document
+    try:
+        await db.reminder_logs.create_index("id", unique=True)
+    except OperationFailure:
+        # The non-unique index of earlier versions has the same name; replace it
+        await db.reminder_logs.drop_index("id_1")
+        await db.reminder_logs.create_index("id", unique=True)
+
+async def backfill_contact_event_keys():
+    """Populate bday_md/anniv_md on contacts created before the keys existed"""
+    updated = 0
+    operations = []
+    cursor = db.contacts.find({}, {"id": 1, "birthday": 1, "anniversary_date": 1})
+    async for contact in cursor:
+        keys = set_contact_event_keys({
+            "birthday": contact.get("birthday"),
+            "anniversary_date": contact.get("anniversary_date")
+        })
+        operations.append(UpdateOne(
+            {"_id": contact["_id"]},
+            {"$set": {"bday_md": keys["bday_md"], "anniv_md": keys["anniv_md"]}}
+        ))
+        if len(operations) >= 500:
+            await db.contacts.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    
+    if operations:
+        await db.contacts.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    
+    return updated
+
+async def backfill_next_send_at():
+    """Populate next_send_at_utc on settings saved before it was tracked"""
+    now = datetime.now(timezone.utc)
+    updated = 0
+    cursor = db.user_settings.find(
+        {"next_send_at_utc": {"$exists": False}},
+        {"user_id": 1, "daily_send_time": 1, "timezone": 1}
+    )
+    async for settings in cursor:
+        next_send_at = compute_next_send_at(settings.get("daily_send_time"), settings.get("timezone"), now)
+        await db.user_settings.update_one(
+            {"_id": settings["_id"]},
+            {"$set": {"next_send_at_utc": utc_iso(next_send_at) if next_send_at else None}}
+        )
+        updated += 1
     
-    # Get contact info
-    contact = await db.contacts.find_one({"id": contact_id, "user_id": user_id})
-    if not contact:
-        return None
+    return updated
+
+# One-time data migrations, applied in order and recorded in db.migrations
+MIGRATIONS = [
+    ("contact_event_keys", backfill_contact_event_keys),
+    ("settings_next_send_at", backfill_next_send_at),
+]
+
+async def run_migrations():
+    for migration_id, migration in MIGRATIONS:
+        if await db.migrations.find_one({"id": migration_id}):
+            continue
+        
+        try:
+            affected = await migration()
+            await db.migrations.insert_one(prepare_for_mongo({
+                "id": migration_id,
+                "affected": affected,
+                "applied_at": datetime.now(timezone.utc)
+            }))
+            logger.info(f"Migration {migration_id} applied ({affected} documents)")
+        except Exception as e:
+            logger.error(f"Migration {migration_id} failed: {str(e)}")
+
+# Background tasks (outbound workers, message pre-generation) started with the app
+background_tasks = []
+
+@app.on_event("startup")
+async def startup_db_client():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.error(f"Index creation failed: {str(e)}")
+    await run_migrations()
     
-    contact = parse_from_mongo(contact)
+    for index in range(OUTBOUND_WORKERS):
+        background_tasks.append(asyncio.create_task(outbound_worker(f"{WORKER_ID}-{index}")))
     
-    # Get custom messages
-    whatsapp_message_data = await db.custom_messages.find_one({
-        "user_id": user_id,
-        "contact_id": contact_id,
-        "occasion": occasion,
-        "message_type": "whatsapp"
-    })
+    get_http_client()
     
-    email_message_data = await db.custom_messages.find_one({
-        "user_id": user_id,
-        "contact_id": contact_id,
-        "occasion": occasion,
-        "message_type": "email"
-    })
+    if SCHEDULER_ENABLED:
+        background_tasks.extend(scheduler.start())
     
-    # Generate WhatsApp message and image
-    if whatsapp_message_data:
-        whatsapp_message = whatsapp_message_data["custom_message"]
-        whatsapp_image = (
-            whatsapp_message_data.get("image_url") or 
-            contact.get("whatsapp_image") or
-            (whatsapp_template.get("whatsapp_image_url") if whatsapp_template else None)
-        )
-    else:
-        # Generate AI message
-        try:
-            # Get user for AI generation
-            user = await db.users.find_one({"id": user_id})
-            if user:
-                user = User(**parse_from_mongo(user))
-                message_request = GenerateMessageRequest(
-                    contact_name=contact["name"],
-                    occasion=occasion,
-                    relationship="friend",
-                    tone=contact.get("message_tone", "normal")
-                )
-                ai_message = await generate_message(message_request, user)
-                whatsapp_message = ai_message.message
-            else:
-                whatsapp_message = f"Happy {occasion}, {contact['name']}! 🎉"
-        except:
-            whatsapp_message = f"Happy {occasion}, {contact['name']}! 🎉"
+    background_tasks.append(asyncio.create_task(delivery_events.run()))
+
+@app.on_event("shutdown")
+async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await delivery_events.flush()
+    await close_http_client()
+    client.close()
+
+# Daily Reminder System
+class ReminderMessageContext:
+    """Default templates, custom and pre-generated messages and the user model for
+    one user's due contacts, loaded once so each contact resolves in memory"""
+    
+    def __init__(self, user: User, templates: dict, custom_messages: dict, pregenerated_messages: Optional[dict] = None):
+        self.user = user
+        self.templates = templates
+        self.custom_messages = custom_messages
+        self.pregenerated_messages = pregenerated_messages or {}
+    
+    @classmethod
+    async def load(cls, user: dict, contact_ids: List[str], event_date: Optional[str] = None) -> "ReminderMessageContext":
+        templates = {}
+        default_templates = await db.templates.find({
+            "user_id": user["id"],
+            "type": {"$in": list(REMINDER_CHANNELS)},
+            "is_default": True
+        }).to_list(100)
+        for template in default_templates:
+            templates.setdefault(template["type"], template)
         
-        whatsapp_image = (
-            contact.get("whatsapp_image") or
-            (whatsapp_template.get("whatsapp_image_url") if whatsapp_template else None)
-        )
-    
-    # Generate Email message and image
-    if email_message_data:
-        email_message = email_message_data["custom_message"]
-        email_image = (
-            email_message_data.get("image_url") or
-            contact.get("email_image") or
-            (email_template.get("email_image_url") if email_template else None)
-        )
-    else:
-        # Generate AI message
-        try:
-            # Get user for AI generation
-            user = await db.users.find_one({"id": user_id})
-            if user:
-                user = User(**parse_from_mongo(user))
-                message_request = GenerateMessageRequest(
+        custom_messages = {}
+        if contact_ids:
+            messages = await db.custom_messages.find({
+                "user_id": user["id"],
+                "contact_id": {"$in": contact_ids}
+            }).to_list(None)
+            for message in messages:
+                key = (message["contact_id"], message["occasion"], message["message_type"])
+                custom_messages.setdefault(key, message)
+        
+        pregenerated_messages = {}
+        if contact_ids and event_date:
+            messages = await db.pregenerated_messages.find({
+                "user_id": user["id"],
+                "contact_id": {"$in": contact_ids},
+                "event_date": event_date
+            }).to_list(None)
+            for message in messages:
+                key = (message["contact_id"], message["occasion"], message["message_type"])
+                pregenerated_messages[key] = message
+        
+        user_model = user if isinstance(user, User) else User(**user)
+        return cls(user_model, templates, custom_messages, pregenerated_messages)
+    
+    def select(self, contact: dict, occasion: str, channel: str) -> tuple:
+        """(source, message, image) for one channel without generating anything. Source is
+        "custom", "pregenerated" or "ai"; an "ai" message is None until generated."""
+        template = self.templates.get(channel)
+        template_image = template.get(f"{channel}_image_url") if template else None
+        custom = self.custom_messages.get((contact["id"], occasion, channel))
+        pregenerated = self.pregenerated_messages.get((contact["id"], occasion, channel))
+        
+        if custom:
+            # Image hierarchy: custom message image -> contact image -> template default image
+            image = custom.get("image_url") or contact.get(f"{channel}_image") or template_image
+            return "custom", custom["custom_message"], image
+        
+        # Image hierarchy: contact image -> template default image
+        image = contact.get(f"{channel}_image") or template_image
+        if pregenerated_message_matches(pregenerated, contact):
+            # AI message generated ahead of time by the pre-generation stage
+            return "pregenerated", pregenerated["message"], image
+        return "ai", None, image
+    
+    async def resolve(
+        self,
+        contact: dict,
+        occasion: str,
+        timings: Optional["ReminderRunTimings"] = None,
+        channels: Optional[List[str]] = None
+    ) -> dict:
+        """Get appropriate message and image for each channel (or only `channels`, the ones
+        that will be sent) with hierarchy logic"""
+        resolved = {"contact": contact}
+        
+        for channel in (REMINDER_CHANNELS if channels is None else channels):
+            source, message, image = self.select(contact, occasion, channel)
+            if source == "ai":
+                # Generate AI message
+                try:
+                    message_request = GenerateMessageRequest(
+                        contact_name=contact["name"],
+                        occasion=occasion,
+                        relationship="friend",
+                        tone=contact.get("message_tone", "normal")
+                    )
+                    started = time.perf_counter()
+                    try:
+                        ai_message = await generate_message(message_request, self.user)
+                    finally:
+                        if timings is not None:
+                            timings.add("llm_generation", time.perf_counter() - started)
+                    message = ai_message.message
+                except Exception:
+                    message = f"Happy {occasion}, {contact['name']}! 🎉"
+            
+            resolved[f"{channel}_message"] = message
+            resolved[f"{channel}_image"] = image
+        
+        return resolved
+
+def pregenerated_message_matches(pregenerated: Optional[dict], contact: dict) -> bool:
+    """A pre-generated message is only valid while the contact's name and tone are unchanged"""
+    return bool(
+        pregenerated and
+        pregenerated.get("contact_name") == contact["name"] and
+        pregenerated.get("tone") == contact.get("message_tone", "normal")
+    )
+
+async def pregenerate_upcoming_messages(days_ahead: int = PREGENERATION_DAYS_AHEAD) -> dict:
+    """Generate AI WhatsApp/email text for events in the next `days_ahead` days so the
+    send-time path only needs a lookup. Days are counted from each user's local date, which
+    is the event_date the send path looks messages up by. Contacts with a custom message are skipped."""
+    now = datetime.now(timezone.utc)
+    stats = {"generated": 0, "up_to_date": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(PREGENERATION_CONCURRENCY)
+    
+    async def generate_for(user_id: str, contact: dict, occasion: str, channel: str, event_date: str):
+        tone = contact.get("message_tone", "normal")
+        async with semaphore:
+            try:
+                message = await generate_llm_message(GenerateMessageRequest(
                     contact_name=contact["name"],
                     occasion=occasion,
                     relationship="friend",
-                    tone=contact.get("message_tone", "normal")
-                )
-                ai_message = await generate_message(message_request, user)
-                email_message = ai_message.message
-            else:
-                email_message = f"Happy {occasion}, {contact['name']}! 🎉"
-        except:
-            email_message = f"Happy {occasion}, {contact['name']}! 🎉"
+                    tone=tone
+                ), user_id)
+            except Exception as e:
+                logger.error(f"Pre-generation failed for contact {contact['id']}: {str(e)}")
+                stats["failed"] += 1
+                return
         
-        email_image = (
-            contact.get("email_image") or
-            (email_template.get("email_image_url") if email_template else None)
-        )
+        key = {
+            "user_id": user_id,
+            "contact_id": contact["id"],
+            "occasion": occasion,
+            "message_type": channel,
+            "event_date": event_date
+        }
+        generated_at = datetime.now(timezone.utc)
+        await db.pregenerated_messages.replace_one(key, {
+            **key,
+            "id": str(uuid.uuid4()),
+            "message": message,
+            "contact_name": contact["name"],
+            "tone": tone,
+            "source": "llm",
+            "model": "/".join(MESSAGE_LLM_MODEL),
+            "generated_at": generated_at.isoformat(),
+            # Native date for the TTL index; kept for a couple of days after the event
+            "expires_at": datetime.fromisoformat(event_date).replace(tzinfo=timezone.utc) + timedelta(days=2)
+        }, upsert=True)
+        stats["generated"] += 1
+    
+    users = db.users.find({"subscription_status": {"$in": ["active", "trial"]}}, {"id": 1})
+    async for user in users:
+        settings = await settings_cache.get(user["id"]) or {}
+        today = now.astimezone(pytz.timezone(settings.get("timezone") or "UTC")).date()
+        upcoming = {}
+        for offset in range(days_ahead + 1):
+            event_day = today + timedelta(days=offset)
+            upcoming[event_month_day(event_day)] = event_day.isoformat()
+        month_days = list(upcoming)
+        
+        contacts = await db.contacts.find({
+            "user_id": user["id"],
+            "$or": [{"bday_md": {"$in": month_days}}, {"anniv_md": {"$in": month_days}}]
+        }).to_list(None)
+        if not contacts:
+            continue
+        
+        contact_ids = [contact["id"] for contact in contacts]
+        custom_keys = {
+            (message["contact_id"], message["occasion"], message["message_type"])
+            async for message in db.custom_messages.find(
+                {"user_id": user["id"], "contact_id": {"$in": contact_ids}},
+                {"contact_id": 1, "occasion": 1, "message_type": 1}
+            )
+        }
+        existing = {
+            (message["contact_id"], message["occasion"], message["message_type"], message["event_date"]): message
+            async for message in db.pregenerated_messages.find({
+                "user_id": user["id"],
+                "contact_id": {"$in": contact_ids},
+                "event_date": {"$in": list(upcoming.values())}
+            })
+        }
+        
+        tasks = []
+        for contact in contacts:
+            for occasion, md_key in (("birthday", "bday_md"), ("anniversary", "anniv_md")):
+                event_date = upcoming.get(contact.get(md_key))
+                if not event_date:
+                    continue
+                
+                for channel in REMINDER_CHANNELS:
+                    if not contact.get(channel) or (contact["id"], occasion, channel) in custom_keys:
+                        continue
+                    if pregenerated_message_matches(existing.get((contact["id"], occasion, channel, event_date)), contact):
+                        stats["up_to_date"] += 1
+                        continue
+                    tasks.append(generate_for(user["id"], contact, occasion, channel, event_date))
+        
+        await asyncio.gather(*tasks)
+    
+    return stats
+
+async def get_contact_message_for_reminder(user_id: str, contact_id: str, occasion: str, channels: Optional[List[str]] = None):
+    """Get appropriate message and image for a single contact's reminder"""
+    contact = await db.contacts.find_one({"id": contact_id, "user_id": user_id})
+    user = await db.users.find_one({"id": user_id})
+    if not contact or not user:
+        return None
+    
+    context = await ReminderMessageContext.load(parse_from_mongo(user), [contact_id])
+    return await context.resolve(parse_from_mongo(contact), occasion, channels=channels)
+
+# Email Rendering
+EMAIL_TEMPLATES = {
+    "reminder.html": """
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h2 style="color: #e11d48; border-bottom: 2px solid #e11d48; padding-bottom: 10px;">
+                    🎉 {{ occasion | title }} Reminder
+                </h2>
+                <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <div style="background-color: white; padding: 15px; border-radius: 6px; border-left: 4px solid #e11d48;">
+                        {{ message }}
+                    </div>
+                    {% if image_url %}<img src="{{ image_url }}" style="max-width: 100%; height: auto; margin-top: 15px; border-radius: 6px;" alt="Celebration Image">{% endif %}
+                </div>
+                <p style="font-size: 14px; color: #6b7280; margin-top: 30px;">
+                    Sent with ❤️ by ReminderAI
+                </p>
+            </div>
+        </body>
+        </html>
+        """
+}
+
+# Tenant templates are user input, so everything renders sandboxed and autoescaped
+email_environment = SandboxedEnvironment(loader=DictLoader(EMAIL_TEMPLATES), autoescape=True)
+
+# Stands in for the message while a frame renders; the frame is split on it
+MESSAGE_SLOT = "\x00message\x00"
+
+# Tenant templates render on the event loop, so they are limited to output, conditions and
+# simple filters; without loops, macros or calls a render takes time linear in the template
+TENANT_TEMPLATE_NODES = (
+    nodes.Output, nodes.TemplateData, nodes.Name, nodes.Const, nodes.If, nodes.CondExpr,
+    nodes.Filter, nodes.Test, nodes.Compare, nodes.Operand, nodes.And, nodes.Or, nodes.Not
+)
+TENANT_TEMPLATE_FILTERS = {"title", "upper", "lower", "capitalize", "trim", "default", "d", "escape", "e"}
+
+@lru_cache(maxsize=64)
+def compile_email_template(source: str):
+    """Compile a tenant's email_html_template after checking it stays within what tenants may use"""
+    if len(source) > EMAIL_TEMPLATE_MAX_LENGTH:
+        raise SecurityError(f"email template is longer than {EMAIL_TEMPLATE_MAX_LENGTH} characters")
+    for node in email_environment.parse(source).find_all(nodes.Node):
+        if type(node) not in TENANT_TEMPLATE_NODES:
+            raise SecurityError(f"email templates may not use {type(node).__name__} constructs")
+        if isinstance(node, nodes.Filter) and node.name not in TENANT_TEMPLATE_FILTERS:
+            raise SecurityError(f"email templates may not use the {node.name} filter")
+    return email_environment.from_string(source)
+
+@lru_cache(maxsize=EMAIL_RENDER_CACHE_SIZE)
+def email_frame(template_source: Optional[str], occasion: str, image_url: Optional[str]) -> tuple:
+    """The email HTML before and after the message, rendered once per template, occasion and image.
+    `template_source` is a tenant's email_html_template, or None for the default."""
+    if template_source:
+        template = compile_email_template(template_source)
+    else:
+        template = email_environment.get_template("reminder.html")
+    html = template.render(occasion=occasion, image_url=image_url, message=Markup(MESSAGE_SLOT))
+    if len(html) > EMAIL_TEMPLATE_MAX_LENGTH:
+        raise ValueError(f"email template renders to more than {EMAIL_TEMPLATE_MAX_LENGTH} characters")
+    if html.count(MESSAGE_SLOT) != 1:
+        raise ValueError("email template must contain {{ message }} exactly once")
+    before, after = html.split(MESSAGE_SLOT)
+    return before, after
+
+def render_email_html(message: str, occasion: str, image_url: Optional[str], template_source: Optional[str] = None) -> str:
+    try:
+        before, after = email_frame(template_source, occasion, image_url)
+    except (TemplateError, ValueError) as e:
+        # A tenant template that broke since it was saved falls back to the default
+        logger.warning(f"Email template failed, using the default: {str(e)}")
+        before, after = email_frame(None, occasion, image_url)
+    return before + str(escape(message)).replace("\n", "<br>\n") + after
+
+def build_email_reminder(
+    contact: dict,
+    occasion: str,
+    message: str,
+    image_url: Optional[str] = None,
+    template_source: Optional[str] = None
+) -> dict:
+    """Recipient, subject and HTML body of a reminder email"""
+    # Convert image URL to absolute URL
+    absolute_image_url = ensure_absolute_image_url(image_url)
+    if not absolute_image_url:
+        absolute_image_url = get_default_celebration_image(occasion)
+    
+    html_content = render_email_html(message, occasion, absolute_image_url, template_source)
     
     return {
-        "whatsapp_message": whatsapp_message,
-        "whatsapp_image": whatsapp_image,
-        "email_message": email_message,
-        "email_image": email_image,
-        "contact": contact
+        "to": [
+            {
+                "email": contact["email"],
+                "name": contact["name"]
+            }
+        ],
+        "subject": f"🎉 {contact['name']}'s {occasion.title()} Reminder",
+        "htmlContent": html_content
     }
 
-async def send_email_reminder(user_id: str, contact: dict, occasion: str, message: str, image_url: Optional[str] = None):
-    """Send email reminder using Brevo API"""
+async def send_email_reminder(
+    user_id: str,
+    contact: dict,
+    occasion: str,
+    message: str,
+    image_url: Optional[str] = None,
+    settings: Optional[dict] = None
+):
+    """Send email reminder using Brevo API; `settings` as for send_whatsapp_message"""
     
-    settings = await db.user_settings.find_one({"user_id": user_id})
+    if settings is None:
+        settings = await settings_cache.get(user_id)
     if not settings:
         return {"status": "error", "message": "Email settings not found"}
     
@@ -2102,255 +3067,1212 @@ async def send_email_reminder(user_id: str, contact: dict, occasion: str, messag
         return {"status": "error", "message": "Email configuration incomplete"}
     
     try:
-        import requests
-        
-        url = "https://api.brevo.com/v3/smtp/email"
+        url = f"{BREVO_API_URL}/smtp/email"
         headers = {
             "api-key": api_key,
             "Content-Type": "application/json"
         }
         
-        # Convert image URL to absolute URL
-        absolute_image_url = ensure_absolute_image_url(image_url)
-        if not absolute_image_url:
-            absolute_image_url = get_default_celebration_image(occasion)
+        payload = {
+            "sender": {
+                "name": sender_name,
+                "email": sender_email
+            },
+            **build_email_reminder(contact, occasion, message, image_url, settings.get("email_html_template"))
+        }
         
-        # Create HTML email content
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #e11d48; border-bottom: 2px solid #e11d48; padding-bottom: 10px;">
-                    🎉 {occasion.title()} Reminder
-                </h2>
-                <div style="background-color: #f8f9fa; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                    <div style="background-color: white; padding: 15px; border-radius: 6px; border-left: 4px solid #e11d48;">
-                        {message}
-                    </div>
-                    {f'<img src="{absolute_image_url}" style="max-width: 100%; height: auto; margin-top: 15px; border-radius: 6px;" alt="Celebration Image">' if absolute_image_url else ''}
-                </div>
-                <p style="font-size: 14px; color: #6b7280; margin-top: 30px;">
-                    Sent with ❤️ by ReminderAI
-                </p>
-            </div>
-        </body>
-        </html>
-        """
+        response = await provider_request("brevo", api_key, "POST", url, json=payload, headers=headers)
         
+        if response.status_code == 201:
+            result = {"status": "success", "message": "Email sent successfully"}
+            message_id = response.json().get("messageId")
+            if message_id:
+                result["message_id"] = message_id
+            return result
+        else:
+            return {
+                "status": "error",
+                "message": f"Email API error: {response.text}",
+                "retryable": is_retryable_status(response.status_code)
+            }
+    
+    except CircuitOpenError as e:
+        return circuit_open_result(e)
+    except Exception as e:
+        return {"status": "error", "message": f"Email sending error: {str(e)}", "retryable": True}
+
+async def send_email_reminders_batch(user_id: str, emails: List[dict], settings: Optional[dict] = None) -> List[dict]:
+    """Send one user's reminder emails in Brevo messageVersions calls of up to BREVO_BATCH_SIZE.
+    `emails` holds send_email_reminder keyword arguments; one result is returned per email, in order."""
+    if settings is None:
+        settings = await settings_cache.get(user_id)
+    
+    if len(emails) == 1 or BREVO_BATCH_SIZE <= 1:
+        return [await send_email_reminder(user_id=user_id, settings=settings, **email) for email in emails]
+    
+    if not settings:
+        return [{"status": "error", "message": "Email settings not found"}] * len(emails)
+    
+    api_key = settings.get("email_api_key")
+    sender_email = settings.get("sender_email")
+    sender_name = settings.get("sender_name", "ReminderAI")
+    
+    if not api_key or not sender_email:
+        return [{"status": "error", "message": "Email configuration incomplete"}] * len(emails)
+    
+    url = f"{BREVO_API_URL}/smtp/email"
+    headers = {
+        "api-key": api_key,
+        "Content-Type": "application/json"
+    }
+    
+    results = []
+    for offset in range(0, len(emails), BREVO_BATCH_SIZE):
+        chunk = emails[offset:offset + BREVO_BATCH_SIZE]
+        versions = [
+            build_email_reminder(
+                email["contact"], email["occasion"], email["message"], email.get("image_url"),
+                settings.get("email_html_template")
+            )
+            for email in chunk
+        ]
+        # Brevo needs a top-level subject and body; every version overrides both
         payload = {
             "sender": {
                 "name": sender_name,
                 "email": sender_email
             },
-            "to": [
-                {
-                    "email": contact["email"],
-                    "name": contact["name"]
-                }
-            ],
-            "subject": f"🎉 {contact['name']}'s {occasion.title()} Reminder",
-            "htmlContent": html_content
+            "subject": versions[0]["subject"],
+            "htmlContent": versions[0]["htmlContent"],
+            "messageVersions": versions
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        try:
+            response = await provider_request("brevo", api_key, "POST", url, json=payload, headers=headers)
+        except CircuitOpenError as e:
+            results.extend([circuit_open_result(e)] * len(chunk))
+            continue
+        except Exception as e:
+            results.extend([{"status": "error", "message": f"Email sending error: {str(e)}", "retryable": True}] * len(chunk))
+            continue
         
         if response.status_code == 201:
-            return {"status": "success", "message": "Email sent successfully"}
+            message_ids = response.json().get("messageIds") or []
+            for index in range(len(chunk)):
+                result = {"status": "success", "message": "Email sent successfully"}
+                if index < len(message_ids):
+                    result["message_id"] = message_ids[index]
+                results.append(result)
+        elif response.status_code == 400:
+            # One invalid recipient rejects the whole call; send the chunk one by one so
+            # the error lands on the email that caused it
+            for email in chunk:
+                results.append(await send_email_reminder(user_id=user_id, settings=settings, **email))
         else:
-            return {"status": "error", "message": f"Email API error: {response.text}"}
-            
+            results.extend([{
+                "status": "error",
+                "message": f"Email API error: {response.text}",
+                "retryable": is_retryable_status(response.status_code)
+            }] * len(chunk))
+    
+    return results
+
+# Channel Providers
+class ChannelProvider(ABC):
+    """A reminder channel and the provider that delivers it. `send_batch` takes outbound
+    job dicts of one user and returns one result per job, in order; by default the jobs
+    are sent concurrently through `send`. New channels are registered next to the built-in
+    ones below, before REMINDER_CHANNELS is derived from the registry."""
+    
+    channel = ""  # Contact field with the recipient; also names the channel's credits, templates and counters
+    label = ""
+    provider = ""  # Rate limiter, circuit breaker and delivery webhook name
+    max_batch_size = 1  # Jobs handed to one send_batch call
+    supports_images = False
+    concurrency = 10  # Concurrent provider calls per reminder run
+    
+    @property
+    def rate_limit(self) -> Optional[tuple]:
+        """(requests per second, burst) per API key"""
+        return PROVIDER_RATE_LIMITS.get(self.provider)
+    
+    def capabilities(self) -> dict:
+        rate_limit = self.rate_limit
+        return {
+            "channel": self.channel,
+            "label": self.label,
+            "provider": self.provider,
+            "max_batch_size": self.max_batch_size,
+            "supports_images": self.supports_images,
+            "concurrency": self.concurrency,
+            "rate_per_second": rate_limit[0] if rate_limit else None,
+            "burst": rate_limit[1] if rate_limit else None
+        }
+    
+    @abstractmethod
+    async def send(self, job: dict, settings: Optional[dict] = None) -> dict:
+        """Send one outbound job dict; returns a result dict with status, message and retryable"""
+    
+    async def send_batch(self, jobs: List[dict], settings: Optional[dict] = None) -> List[dict]:
+        results = await asyncio.gather(*(self.send(job, settings) for job in jobs), return_exceptions=True)
+        return [
+            {"status": "error", "message": f"{self.label} sending error: {str(result)}", "retryable": True}
+            if isinstance(result, Exception) else result
+            for result in results
+        ]
+
+class WhatsAppChannel(ChannelProvider):
+    channel = "whatsapp"
+    label = "WhatsApp"
+    provider = "digitalsms"
+    supports_images = True
+    concurrency = REMINDER_WHATSAPP_CONCURRENCY
+    
+    async def send(self, job: dict, settings: Optional[dict] = None) -> dict:
+        return await send_whatsapp_message(
+            user_id=job["user_id"],
+            phone_number=job["recipient"],
+            message=job["message"],
+            image_url=job.get("image_url"),
+            occasion=job["occasion"],
+            settings=settings
+        )
+
+class EmailChannel(ChannelProvider):
+    channel = "email"
+    label = "Email"
+    provider = "brevo"
+    max_batch_size = BREVO_BATCH_SIZE
+    supports_images = True
+    concurrency = REMINDER_EMAIL_CONCURRENCY
+    
+    async def send(self, job: dict, settings: Optional[dict] = None) -> dict:
+        return await send_email_reminder(user_id=job["user_id"], settings=settings, **outbound_email(job))
+    
+    async def send_batch(self, jobs: List[dict], settings: Optional[dict] = None) -> List[dict]:
+        # Brevo messageVersions: one call per BREVO_BATCH_SIZE emails
+        return await send_email_reminders_batch(jobs[0]["user_id"], [outbound_email(job) for job in jobs], settings)
+
+channel_providers = {}
+
+def register_channel_provider(provider: ChannelProvider):
+    channel_providers[provider.channel] = provider
+
+register_channel_provider(WhatsAppChannel())
+register_channel_provider(EmailChannel())
+
+REMINDER_CHANNELS = tuple(channel_providers)
+CHANNEL_LABELS = {channel: provider.label for channel, provider in channel_providers.items()}
+
+# Outbound Delivery Queue
+async def send_outbound_message(job: dict, settings: Optional[dict] = None) -> dict:
+    """Deliver a single outbound message through its channel provider"""
+    return await channel_providers[job["channel"]].send(job, settings)
+
+def outbound_email(job: dict) -> dict:
+    """send_email_reminder arguments (without user_id) for an email job"""
+    return {
+        "contact": {"email": job["recipient"], "name": job["contact_name"]},
+        "occasion": job["occasion"],
+        "message": job["message"],
+        "image_url": job.get("image_url")
+    }
+
+async def charge_send_credit(job: dict):
+    if job.get("charge_credit"):
+        # Unlimited users are never charged and a balance never goes below zero
+        await db.users.update_one(
+            {
+                "id": job["user_id"],
+                f"unlimited_{job['channel']}": {"$ne": True},
+                f"{job['channel']}_credits": {"$gte": 1}
+            },
+            {"$inc": {f"{job['channel']}_credits": -1}}
+        )
+
+async def refund_send_credit(job: dict):
+    if job.get("credit_reserved"):
+        await db.users.update_one(
+            {"id": job["user_id"]},
+            {"$inc": {f"{job['channel']}_credits": 1}}
+        )
+
+async def enqueue_outbound_job(job: OutboundJob):
+    await db.outbound_jobs.insert_one(prepare_for_mongo(job.dict()))
+
+async def claim_outbound_job(worker_id: str, match: Optional[dict] = None) -> Optional[dict]:
+    """Lease the oldest available job (or one whose lease expired) for this worker,
+    optionally restricted to jobs matching `match`"""
+    now = datetime.now(timezone.utc)
+    now_iso = utc_iso(now)
+    return await db.outbound_jobs.find_one_and_update(
+        {
+            "$or": [
+                {"status": "pending", "available_at": {"$lte": now_iso}},
+                {"status": "leased", "lease_expires_at": {"$lte": now_iso}}
+            ],
+            **(match or {})
+        },
+        {
+            "$set": {
+                "status": "leased",
+                "worker_id": worker_id,
+                "lease_expires_at": utc_iso(now + timedelta(seconds=OUTBOUND_LEASE_SECONDS))
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def record_run_outcome(
+    run_id: Optional[str],
+    channel: str,
+    error: Optional[str] = None,
+    send_seconds: Optional[float] = None
+):
+    """Add a delivery outcome (and the provider call's wall time) to the ReminderLog of the run that planned it"""
+    if not run_id:
+        return
+    
+    if error:
+        update = {"$push": {"errors": error}}
+    else:
+        update = {"$inc": {f"{channel}_sent": 1, "messages_sent": 1}}
+    
+    if send_seconds is not None:
+        stage = f"queued_stage_timings.{channel}_send"
+        update.setdefault("$inc", {}).update({f"{stage}.count": 1, f"{stage}.total_seconds": round(send_seconds, 4)})
+        update["$max"] = {f"{stage}.max_seconds": round(send_seconds, 4)}
+    await upsert_reminder_log(run_id, update)
+
+async def upsert_reminder_log(run_id: str, update: dict):
+    """Upsert a ReminderLog by id. When two writers insert the same new id at once, the
+    unique index rejects one of them, which then applies its update to the winner's document."""
+    try:
+        await db.reminder_logs.update_one({"id": run_id}, update, upsert=True)
+    except DuplicateKeyError:
+        await db.reminder_logs.update_one({"id": run_id}, update, upsert=True)
+
+async def start_reminder_log(run: "ReminderRunContext"):
+    """Write the log's date and execution time before any of the run's jobs is enqueued,
+    so outcomes reported by queue workers never land in a log without them"""
+    if run.log_started:
+        return
+    run.log_started = True
+    await upsert_reminder_log(run.run_id, {"$setOnInsert": prepare_for_mongo({
+        "id": run.run_id,
+        "date": run.execution_time.date().isoformat(),
+        "execution_time": run.execution_time
+    })})
+
+def retry_delay_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter, so jobs that failed together do not retry together"""
+    ceiling = min(OUTBOUND_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), OUTBOUND_RETRY_MAX_SECONDS)
+    return random.uniform(ceiling / 2, ceiling)
+
+async def dead_letter_job(job: dict, result: dict):
+    """Keep a job that will not be retried any more so an admin can replay it"""
+    snapshot = {
+        key: value for key, value in job.items()
+        if key not in ("_id", "worker_id", "lease_expires_at")
+    }
+    await db.dead_letters.insert_one({
+        "id": str(uuid.uuid4()),
+        "job_id": job["id"],
+        "user_id": job["user_id"],
+        "channel": job["channel"],
+        "error": result["message"],
+        "retryable": bool(result.get("retryable")),
+        "attempts": job.get("attempts", 0),
+        "job": snapshot,
+        "dead_lettered_at": utc_iso(datetime.now(timezone.utc)),
+        "replayed_at": None
+    })
+
+async def defer_failed_send(job: OutboundJob, result: dict) -> bool:
+    """Hand a failed inline send to the outbound queue for a retry (True), or dead-letter it"""
+    job.attempts = 1
+    job.last_error = result["message"]
+    
+    if result.get("retry_at"):
+        # Fast-failed by an open circuit; nothing was attempted
+        job.attempts = 0
+        job.available_at = result["retry_at"]
+    elif result.get("retryable") and OUTBOUND_MAX_ATTEMPTS > 1:
+        job.available_at = utc_iso(datetime.now(timezone.utc) + timedelta(seconds=retry_delay_seconds(1)))
+    else:
+        await dead_letter_job(prepare_for_mongo(job.dict()), result)
+        return False
+    
+    await enqueue_outbound_job(job)
+    return True
+
+async def replay_dead_letter(dead_letter: dict) -> str:
+    """Put a dead-lettered job back on the outbound queue. The credit reserved for it was
+    refunded when it was dead-lettered, so a new one is reserved, as for a planned send.
+    Returns "replayed", "already_replayed" or "no_credits"."""
+    channel = dead_letter["job"]["channel"]
+    user_id = dead_letter["job"]["user_id"]
+    user = await db.users.find_one({"id": user_id}, {f"unlimited_{channel}": 1})
+    unlimited = bool(user and user.get(f"unlimited_{channel}"))
+    if not unlimited:
+        reserved = await db.users.update_one(
+            {"id": user_id, f"{channel}_credits": {"$gte": 1}},
+            {"$inc": {f"{channel}_credits": -1}}
+        )
+        if not reserved.modified_count:
+            return "no_credits"
+    
+    now = utc_iso(datetime.now(timezone.utc))
+    marked = await db.dead_letters.update_one(
+        {"id": dead_letter["id"], "replayed_at": None},
+        {"$set": {"replayed_at": now}}
+    )
+    if not marked.modified_count:
+        if not unlimited:
+            await db.users.update_one({"id": user_id}, {"$inc": {f"{channel}_credits": 1}})
+        return "already_replayed"
+    
+    job = {
+        **dead_letter["job"],
+        "status": "pending",
+        "attempts": 0,
+        "available_at": now,
+        "lease_expires_at": None,
+        "last_error": None,
+        "run_id": None,  # The original run has been logged; do not rewrite its counters
+        "charge_credit": False,
+        # The worker refunds the reserved credit if the replay fails too
+        "credit_reserved": not unlimited
+    }
+    await db.outbound_jobs.update_one({"id": job["id"]}, {"$set": job}, upsert=True)
+    return "replayed"
+
+async def claim_channel_batch(worker_id: str, job: dict) -> List[dict]:
+    """Lease more available jobs of the same user and channel so they go out in one send_batch.
+    The candidates are found and leased in one write each; another worker may lease some of
+    them in between, so the jobs this batch got are re-read by its lease id."""
+    limit = channel_providers[job["channel"]].max_batch_size - 1
+    if limit <= 0:
+        return [job]
+    
+    now = datetime.now(timezone.utc)
+    now_iso = utc_iso(now)
+    available = {
+        "$or": [
+            {"status": "pending", "available_at": {"$lte": now_iso}},
+            {"status": "leased", "lease_expires_at": {"$lte": now_iso}}
+        ],
+        "user_id": job["user_id"],
+        "channel": job["channel"]
+    }
+    candidates = await db.outbound_jobs.find(available, {"id": 1}).sort("available_at", 1).to_list(limit)
+    if not candidates:
+        return [job]
+    
+    candidate_ids = [candidate["id"] for candidate in candidates]
+    lease_id = str(uuid.uuid4())
+    await db.outbound_jobs.update_many(
+        {"id": {"$in": candidate_ids}, **available},
+        {
+            "$set": {
+                "status": "leased",
+                "worker_id": worker_id,
+                "lease_id": lease_id,
+                "lease_expires_at": utc_iso(now + timedelta(seconds=OUTBOUND_LEASE_SECONDS))
+            },
+            "$inc": {"attempts": 1}
+        }
+    )
+    leased = await db.outbound_jobs.find({"id": {"$in": candidate_ids}, "lease_id": lease_id}).to_list(limit)
+    leased.sort(key=lambda leased_job: leased_job["available_at"])
+    return [job, *leased]
+
+async def process_channel_batch(jobs: List[dict]):
+    """Send leased jobs of one user and channel as a batch and record each job's outcome"""
+    started = time.perf_counter()
+    try:
+        results = await channel_providers[jobs[0]["channel"]].send_batch(jobs)
     except Exception as e:
-        return {"status": "error", "message": f"Email sending error: {str(e)}"}
+        results = [{"status": "error", "message": str(e)}] * len(jobs)
+    # The call's wall time is shared evenly by the emails it carried
+    send_seconds = (time.perf_counter() - started) / len(jobs)
+    
+    for job, result in zip(jobs, results):
+        await record_outbound_result(job, result, send_seconds)
 
-async def send_reminder_messages(user: dict, contact: dict, occasion: str, results: dict):
-    """Send WhatsApp and Email reminders for a contact"""
+async def process_outbound_job(job: dict):
+    """Send a leased job and record the outcome"""
+    started = time.perf_counter()
     try:
-        # Get messages with image hierarchy
-        message_data = await get_contact_message_for_reminder(user["id"], contact["id"], occasion)
-        if not message_data:
-            results["errors"].append(f"Could not generate message for {contact['name']}")
-            return
+        result = await send_outbound_message(job)
+    except Exception as e:
+        result = {"status": "error", "message": str(e)}
+    await record_outbound_result(job, result, time.perf_counter() - started)
+
+async def record_outbound_result(job: dict, result: dict, send_seconds: float):
+    """Complete a leased job from its send result, rescheduling retryable failures until attempts
+    run out and dead-lettering the rest"""
+    now = datetime.now(timezone.utc)
+    lease = {"id": job["id"], "worker_id": job["worker_id"], "status": "leased"}
+    
+    if result["status"] == "success":
+        completed = await db.outbound_jobs.update_one(
+            lease,
+            {"$set": {"status": "sent", "sent_at": utc_iso(now), "last_error": None}}
+        )
+        if completed.modified_count:
+            await charge_send_credit(job)
+            await record_run_outcome(job.get("run_id"), job["channel"], send_seconds=send_seconds)
+            await track_sent_message(job, result)
+        return
+    
+    if result.get("retry_at"):
+        # Fast-failed by an open circuit: nothing was attempted, so the attempt is given back
+        await db.outbound_jobs.update_one(
+            lease,
+            {
+                "$set": {"status": "pending", "available_at": result["retry_at"], "last_error": result["message"]},
+                "$inc": {"attempts": -1}
+            }
+        )
+        return
+    
+    if result.get("retryable") and job["attempts"] < OUTBOUND_MAX_ATTEMPTS:
+        await db.outbound_jobs.update_one(
+            lease,
+            {"$set": {
+                "status": "pending",
+                "available_at": utc_iso(now + timedelta(seconds=retry_delay_seconds(job["attempts"]))),
+                "last_error": result["message"]
+            }}
+        )
+        return
+    
+    # Permanent failure or attempts exhausted
+    failed = await db.outbound_jobs.update_one(
+        lease,
+        {"$set": {"status": "failed", "last_error": result["message"]}}
+    )
+    if failed.modified_count:
+        await dead_letter_job(job, result)
+        await refund_send_credit(job)
+        await record_run_outcome(
+            job.get("run_id"),
+            job["channel"],
+            f"{CHANNEL_LABELS[job['channel']]} failed for {job['contact_name']}: {result['message']}",
+            send_seconds
+        )
+
+async def outbound_worker(worker_id: str):
+    """Claim and deliver outbound jobs until cancelled"""
+    while True:
+        try:
+            job = await claim_outbound_job(worker_id)
+            if not job:
+                await asyncio.sleep(OUTBOUND_POLL_INTERVAL_SECONDS)
+                continue
+            if channel_providers[job["channel"]].max_batch_size > 1:
+                await process_channel_batch(await claim_channel_batch(worker_id, job))
+            else:
+                await process_outbound_job(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Outbound worker {worker_id} error: {str(e)}")
+            await asyncio.sleep(OUTBOUND_POLL_INTERVAL_SECONDS)
+
+async def claim_send_ledger(user_id: str, contact_id: str, occasion: str, channel: str, local_date: str, run_id: str) -> Optional[str]:
+    """Claim the right to send one reminder in a single atomic insert.
+    Returns the ledger entry id, or None when an earlier tick already claimed it."""
+    entry_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    try:
+        await db.sent_ledger.insert_one({
+            "id": entry_id,
+            "user_id": user_id,
+            "contact_id": contact_id,
+            "occasion": occasion,
+            "channel": channel,
+            "local_date": local_date,
+            "run_id": run_id,
+            "claimed_at": now.isoformat(),
+            "expires_at": now + timedelta(days=SENT_LEDGER_RETENTION_DAYS)  # Native date for the TTL index
+        })
+    except DuplicateKeyError:
+        return None
+    return entry_id
+
+async def release_send_ledger(entry_ids: List[str]):
+    """Drop claims for sends that were never attempted so a later run may retry them"""
+    await db.sent_ledger.delete_many({"id": {"$in": entry_ids}})
+
+def reminder_channel_limits() -> dict:
+    """Per-channel semaphores shared by every contact in a reminder run"""
+    return {channel: asyncio.Semaphore(provider.concurrency) for channel, provider in channel_providers.items()}
+
+REMINDER_STAGES = (
+    "settings_lookup", "user_selection", "contact_scan", "message_resolution", "llm_generation",
+    *(f"{channel}_send" for channel in REMINDER_CHANNELS), "credit_writes", "enqueue"
+)
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+class ReminderRunTimings:
+    """Wall time per pipeline stage and per contact within one reminder run"""
+    
+    def __init__(self, slowest_count: int = REMINDER_SLOWEST_CONTACTS):
+        self.samples = {stage: [] for stage in REMINDER_STAGES}
+        self.slowest_count = slowest_count
+        self.contacts = []  # Min-heap of (seconds, sequence, contact info)
+        self.contacts_seen = 0
+    
+    def add(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+    
+    @contextmanager
+    def stage(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+    
+    async def timed(self, stage: str, iterator):
+        """Re-yield an async iterator (e.g. a Mongo cursor), timing each fetch under `stage`"""
+        iterator = iterator.__aiter__()
+        while True:
+            started = time.perf_counter()
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                self.add(stage, time.perf_counter() - started)
+            yield item
+    
+    def add_contact(self, seconds: float, info: dict):
+        self.contacts_seen += 1
+        entry = (seconds, self.contacts_seen, {**info, "seconds": round(seconds, 4)})
+        if len(self.contacts) < self.slowest_count:
+            heapq.heappush(self.contacts, entry)
+        elif seconds > self.contacts[0][0]:
+            heapq.heapreplace(self.contacts, entry)
+    
+    def summary(self) -> dict:
+        summary = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            summary[stage] = {
+                "count": len(ordered),
+                "total_seconds": round(sum(ordered), 4),
+                "p50_seconds": round(percentile(ordered, 0.5), 4),
+                "p95_seconds": round(percentile(ordered, 0.95), 4),
+                "max_seconds": round(ordered[-1], 4)
+            }
+        return summary
+    
+    def slowest_contacts(self) -> List[dict]:
+        return [info for _, _, info in sorted(self.contacts, key=lambda entry: entry[0], reverse=True)]
+
+class ReminderRunContext:
+    """State shared by every user and contact within one daily reminder run"""
+    
+    def __init__(self, execution_time: Optional[datetime] = None, run_id: Optional[str] = None):
+        self.run_id = run_id or str(uuid.uuid4())
+        self.execution_time = execution_time or datetime.now(timezone.utc)
+        self.channel_limits = reminder_channel_limits()
+        self.timings = ReminderRunTimings()
+        self.shard: Optional[tuple] = None
+        # Settings of the users this run claimed, so sends don't read them again
+        self.settings = SettingsCache(ttl=None)
+        self.log_started = False
+
+def user_shard(user_id: str, shard_count: int) -> int:
+    """Stable shard number for a user; Python's hash() is salted per process so md5 is used"""
+    return int(hashlib.md5(user_id.encode()).hexdigest(), 16) % shard_count
+
+class CreditReservation:
+    """Credits reserved for one user's planned sends in a single conditional write.
+    Each send takes one; whatever is left over is refunded by settle(). The reservation is
+    recorded under the user's credit_reservations with its run id until it is settled, so
+    one left behind by a crashed run can be released when its slot is claimed again."""
+    
+    def __init__(self, user_id: str, reserved: dict, unlimited: dict, reservation_id: Optional[str] = None):
+        self.user_id = user_id
+        self.reserved = reserved
+        self.available = dict(reserved)
+        self.unlimited = unlimited
+        self.reservation_id = reservation_id
+    
+    @classmethod
+    async def reserve(cls, user: dict, planned: dict, run_id: Optional[str] = None) -> "CreditReservation":
+        """Reserve `planned` credits per channel, or as many as the balance allows"""
+        unlimited = {channel: user.get(f"unlimited_{channel}", False) for channel in REMINDER_CHANNELS}
+        reserved = {channel: 0 for channel in REMINDER_CHANNELS}
+        reservation_id = str(uuid.uuid4())
+        needed = {
+            channel: count for channel, count in planned.items()
+            if count > 0 and not unlimited[channel]
+        }
         
-        # Send WhatsApp if configured and credits available
-        if (contact.get("whatsapp") and 
-            user.get("whatsapp_credits", 0) > 0 and
-            not user.get("unlimited_whatsapp", False)):
+        # The balance can change concurrently (top-ups, other runs), so the conditional
+        # $inc is retried with the fresh balance when it does not cover the request
+        for _ in range(3):
+            if not needed:
+                break
             
-            whatsapp_result = await send_whatsapp_message(
-                user_id=user["id"],
-                phone_number=contact["whatsapp"],
-                message=message_data["whatsapp_message"],
-                image_url=message_data["whatsapp_image"],
-                occasion=occasion
+            reservation = await db.users.update_one(
+                {"id": user["id"], **{f"{channel}_credits": {"$gte": count} for channel, count in needed.items()}},
+                {
+                    "$inc": {f"{channel}_credits": -count for channel, count in needed.items()},
+                    "$set": {f"credit_reservations.{reservation_id}": {
+                        "run_id": run_id,
+                        "credits": needed,
+                        "reserved_at": utc_iso(datetime.now(timezone.utc))
+                    }}
+                }
             )
+            if reservation.modified_count:
+                reserved.update(needed)
+                return cls(user["id"], reserved, unlimited, reservation_id)
             
-            if whatsapp_result["status"] == "success":
-                results["whatsapp_sent"] += 1
-                results["messages_sent"] += 1
-                # Deduct credit if not unlimited
-                if not user.get("unlimited_whatsapp", False):
-                    await db.users.update_one(
-                        {"id": user["id"]},
-                        {"$inc": {"whatsapp_credits": -1}}
-                    )
-            else:
-                results["errors"].append(f"WhatsApp failed for {contact['name']}: {whatsapp_result['message']}")
+            current = await db.users.find_one({"id": user["id"]}, {f"{channel}_credits": 1 for channel in needed})
+            if not current:
+                break
+            needed = {
+                channel: min(count, max(0, current.get(f"{channel}_credits", 0)))
+                for channel, count in needed.items()
+            }
+            needed = {channel: count for channel, count in needed.items() if count > 0}
         
-        # Send WhatsApp if unlimited credits
-        elif (contact.get("whatsapp") and user.get("unlimited_whatsapp", False)):
-            whatsapp_result = await send_whatsapp_message(
-                user_id=user["id"],
-                phone_number=contact["whatsapp"],
-                message=message_data["whatsapp_message"],
-                image_url=message_data["whatsapp_image"],
-                occasion=occasion
+        return cls(user["id"], reserved, unlimited)
+    
+    def take(self, channel: str) -> bool:
+        if self.unlimited[channel]:
+            return True
+        if self.available[channel] <= 0:
+            return False
+        self.available[channel] -= 1
+        return True
+    
+    def give_back(self, channel: str):
+        if not self.unlimited[channel]:
+            self.available[channel] += 1
+    
+    async def settle(self):
+        """Refund every reserved credit that was not used, in one write"""
+        if self.reservation_id:
+            key = f"credit_reservations.{self.reservation_id}"
+            update = {"$unset": {key: ""}}
+            refund = {f"{channel}_credits": count for channel, count in self.available.items() if count > 0}
+            if refund:
+                update["$inc"] = refund
+            # Matches nothing if the reservation was already released as stale
+            await db.users.update_one({"id": self.user_id, key: {"$exists": True}}, update)
+        self.available = {channel: 0 for channel in REMINDER_CHANNELS}
+        self.reservation_id = None
+
+async def release_stale_credit_reservations(user_id: str, run_id: str):
+    """Refund the credit reservations a run left unsettled, e.g. because it crashed or its
+    slot lease expired. Credits of sends the run claimed in the send ledger count as used."""
+    user = await db.users.find_one({"id": user_id}, {"credit_reservations": 1})
+    reservations = {
+        reservation_id: reservation
+        for reservation_id, reservation in ((user or {}).get("credit_reservations") or {}).items()
+        if reservation.get("run_id") == run_id
+    }
+    if not reservations:
+        return
+    
+    used = {channel: 0 for channel in REMINDER_CHANNELS}
+    async for entry in db.sent_ledger.find({"user_id": user_id, "run_id": run_id}, {"channel": 1}):
+        if entry.get("channel") in used:
+            used[entry["channel"]] += 1
+    
+    for reservation_id, reservation in reservations.items():
+        key = f"credit_reservations.{reservation_id}"
+        refund = {}
+        for channel, count in reservation.get("credits", {}).items():
+            spent = min(count, used.get(channel, 0))
+            used[channel] = used.get(channel, 0) - spent
+            if count > spent:
+                refund[f"{channel}_credits"] = count - spent
+        update = {"$unset": {key: ""}}
+        if refund:
+            update["$inc"] = refund
+        released = await db.users.update_one({"id": user_id, key: {"$exists": True}}, update)
+        if released.modified_count and refund:
+            logger.warning(f"Released stale credit reservation {reservation_id} of run {run_id} for user {user_id}: {refund}")
+
+async def send_reminder_messages(
+    user: dict,
+    contact: dict,
+    occasion: str,
+    results: dict,
+    run: Optional[ReminderRunContext] = None,
+    local_date: Optional[str] = None,
+    message_context: Optional[ReminderMessageContext] = None,
+    credits: Optional[CreditReservation] = None,
+    batches: Optional[dict] = None
+):
+    """Send (or enqueue) WhatsApp and Email reminders for a contact. Credits come out of
+    `credits`, the user's reservation; without one, this contact reserves and settles its own.
+    Inline sends of channels that batch are appended to `batches[channel]` when given,
+    for send_reminder_batch."""
+    if run is None:
+        run = ReminderRunContext()
+    if local_date is None:
+        local_date = run.execution_time.date().isoformat()
+    
+    if credits is None:
+        credits = await CreditReservation.reserve(
+            user, {channel: 1 for channel in REMINDER_CHANNELS if contact.get(channel)}, run.run_id
+        )
+        try:
+            return await send_reminder_messages(
+                user, contact, occasion, results, run, local_date, message_context, credits, batches
             )
+        finally:
+            await credits.settle()
+    
+    claimed_channels = {}
+    used_channels = set()
+    failed_channels = set()
+    try:
+        # Claim each eligible channel in the send ledger before generating anything,
+        # so a contact matched again by an overlapping tick costs no LLM call or credit
+        for channel in REMINDER_CHANNELS:
+            # Send if the contact is reachable and a reserved (or unlimited) credit is left
+            if not contact.get(channel) or not credits.take(channel):
+                continue
             
-            if whatsapp_result["status"] == "success":
-                results["whatsapp_sent"] += 1
-                results["messages_sent"] += 1
-            else:
-                results["errors"].append(f"WhatsApp failed for {contact['name']}: {whatsapp_result['message']}")
+            entry_id = await claim_send_ledger(user["id"], contact["id"], occasion, channel, local_date, run.run_id)
+            if not entry_id:
+                credits.give_back(channel)
+                results["duplicates_skipped"] += 1
+                continue
+            claimed_channels[channel] = entry_id
         
-        # Send Email if configured and credits available
-        if (contact.get("email") and 
-            user.get("email_credits", 0) > 0 and
-            not user.get("unlimited_email", False)):
-            
-            email_result = await send_email_reminder(
-                user_id=user["id"],
-                contact=contact,
-                occasion=occasion,
-                message=message_data["email_message"],
-                image_url=message_data["email_image"]
-            )
-            
-            if email_result["status"] == "success":
-                results["email_sent"] += 1  
-                results["messages_sent"] += 1
-                # Deduct credit if not unlimited
-                if not user.get("unlimited_email", False):
-                    await db.users.update_one(
-                        {"id": user["id"]},
-                        {"$inc": {"email_credits": -1}}
-                    )
+        if not claimed_channels:
+            return
+        
+        # Get messages with image hierarchy
+        with run.timings.stage("message_resolution"):
+            if message_context is not None:
+                message_data = await message_context.resolve(contact, occasion, run.timings, list(claimed_channels))
             else:
-                results["errors"].append(f"Email failed for {contact['name']}: {email_result['message']}")
+                message_data = await get_contact_message_for_reminder(
+                    user["id"], contact["id"], occasion, list(claimed_channels)
+                )
+        if not message_data:
+            results["errors"].append(f"Could not generate message for {contact['name']}")
+            return
         
-        # Send Email if unlimited credits
-        elif (contact.get("email") and user.get("unlimited_email", False)):
-            email_result = await send_email_reminder(
+        async def dispatch(channel: str, entry_id: str):
+            provider = channel_providers[channel]
+            job = OutboundJob(
+                id=entry_id,
+                run_id=run.run_id,
                 user_id=user["id"],
-                contact=contact,
+                contact_id=contact["id"],
+                contact_name=contact["name"],
                 occasion=occasion,
-                message=message_data["email_message"],
-                image_url=message_data["email_image"]
+                channel=channel,
+                recipient=contact[channel],
+                message=message_data[f"{channel}_message"],
+                image_url=message_data[f"{channel}_image"] if provider.supports_images else None,
+                charge_credit=False,
+                credit_reserved=not credits.unlimited[channel]
             )
             
-            if email_result["status"] == "success":
-                results["email_sent"] += 1
+            if REMINDER_DELIVERY_MODE == "queue":
+                # The queued job owns the reserved credit; the worker refunds it if delivery fails
+                with run.timings.stage("enqueue"):
+                    await enqueue_outbound_job(job)
+                used_channels.add(channel)
+                results["messages_queued"] += 1
+                return
+            
+            if batches is not None and provider.max_batch_size > 1:
+                # The batch owns the reserved credit and gives it back if the send fails
+                batches.setdefault(channel, []).append(job)
+                used_channels.add(channel)
+                return
+            
+            async with run.channel_limits[channel]:
+                with run.timings.stage(f"{channel}_send"):
+                    result = await provider.send(job.dict(), await run.settings.get(user["id"]))
+            
+            if result["status"] == "success":
+                used_channels.add(channel)
+                results[f"{channel}_sent"] += 1
                 results["messages_sent"] += 1
+                await track_sent_message(job.dict(), result)
+            elif await defer_failed_send(job, result):
+                # The retry job owns the reserved credit and reports its outcome to this run
+                used_channels.add(channel)
+                results["messages_queued"] += 1
             else:
-                results["errors"].append(f"Email failed for {contact['name']}: {email_result['message']}")
-                
+                failed_channels.add(channel)
+                results["errors"].append(f"{CHANNEL_LABELS[channel]} failed for {contact['name']}: {result['message']}")
+        
+        # The channels are independent, so a contact's sends go out concurrently; a channel
+        # that raises is reported on its own without cancelling the others
+        outcomes = await asyncio.gather(
+            *(dispatch(channel, entry_id) for channel, entry_id in claimed_channels.items()),
+            return_exceptions=True
+        )
+        for channel, outcome in zip(claimed_channels, outcomes):
+            if isinstance(outcome, Exception):
+                results["errors"].append(f"Error processing {CHANNEL_LABELS[channel]} for {contact['name']}: {str(outcome)}")
+        
     except Exception as e:
         results["errors"].append(f"Error processing {contact['name']}: {str(e)}")
+    finally:
+        # Credits of claimed but unsent channels go back to the reservation for settlement
+        for channel in claimed_channels:
+            if channel not in used_channels:
+                credits.give_back(channel)
+        # Claims of channels that never reached the provider are released so a later run may
+        # send them; a send the provider rejected keeps its claim
+        unattempted = [
+            entry_id for channel, entry_id in claimed_channels.items()
+            if channel not in used_channels and channel not in failed_channels
+        ]
+        if unattempted:
+            try:
+                await release_send_ledger(unattempted)
+            except Exception as e:
+                logger.error(f"Could not release send ledger claims {unattempted}: {str(e)}")
+
+async def send_reminder_batch(
+    user: dict,
+    channel: str,
+    jobs: List[OutboundJob],
+    results: dict,
+    run: ReminderRunContext,
+    credits: CreditReservation
+):
+    """Send a user's inline reminders of one channel in the provider's batches and record each outcome"""
+    provider = channel_providers[channel]
+    settings = await run.settings.get(user["id"])
+    outcomes = []
+    for offset in range(0, len(jobs), provider.max_batch_size):
+        chunk = [job.dict() for job in jobs[offset:offset + provider.max_batch_size]]
+        try:
+            async with run.channel_limits[channel]:
+                with run.timings.stage(f"{channel}_send"):
+                    outcomes.extend(await provider.send_batch(chunk, settings))
+        except Exception as e:
+            outcomes.extend([{"status": "error", "message": str(e)}] * len(chunk))
+    
+    for job, outcome in zip(jobs, outcomes):
+        if outcome["status"] == "success":
+            results[f"{channel}_sent"] += 1
+            results["messages_sent"] += 1
+            await track_sent_message(job.dict(), outcome)
+        elif await defer_failed_send(job, outcome):
+            results["messages_queued"] += 1
+        else:
+            credits.give_back(channel)
+            results["errors"].append(f"{provider.label} failed for {job.contact_name}: {outcome['message']}")
+
+REMINDER_COUNTERS = (
+    "total_users", "messages_sent", *(f"{channel}_sent" for channel in REMINDER_CHANNELS),
+    "messages_queued", "duplicates_skipped", "users_caught_up"
+)
+
+def new_reminder_results() -> dict:
+    """Empty per-user result bucket, merged into the run results when the user finishes"""
+    results = {key: 0 for key in REMINDER_COUNTERS}
+    results["errors"] = []
+    return results
+
+def merge_reminder_results(results: dict, partial: dict):
+    for key in REMINDER_COUNTERS:
+        results[key] += partial.get(key, 0)
+    results["errors"].extend(partial.get("errors", []))
+
+async def process_user_reminders(user: dict, settings: dict, send_at: datetime, run: ReminderRunContext) -> dict:
+    """Send the reminders due at `send_at` for a single user, fanning out over their contacts"""
+    user_id = user["id"]
+    results = new_reminder_results()
+    results["total_users"] += 1
+    
+    try:
+        # A run that claimed this slot before and never completed it may have left credits reserved
+        if settings.get("pending_run_id"):
+            with run.timings.stage("credit_writes"):
+                await release_stale_credit_reservations(user_id, settings["pending_run_id"])
+        
+        # Events are matched against the user's local date for this send slot
+        try:
+            user_tz = pytz.timezone(settings.get("timezone") or "UTC")
+            local_date = send_at.astimezone(user_tz).date()
+            today_md = event_month_day(local_date)
+        except Exception as tz_error:
+            results["errors"].append(f"Timezone error for user {user['email']}: {str(tz_error)}")
+            return results
+        
+        # Get only the contacts with an event today (indexed on user_id + month-day key)
+        with run.timings.stage("contact_scan"):
+            contacts = [
+                contact async for contact in db.contacts.find({
+                    "user_id": user_id,
+                    "$or": [{"bday_md": today_md}, {"anniv_md": today_md}]
+                }).batch_size(MONGO_BATCH_SIZE)
+            ]
+        
+        if not contacts:
+            return results
+        
+        # Templates, custom messages and the user model are loaded once for all due contacts
+        with run.timings.stage("message_resolution"):
+            message_context = await ReminderMessageContext.load(
+                user, [contact["id"] for contact in contacts], local_date.isoformat()
+            )
+        contact_semaphore = asyncio.Semaphore(REMINDER_CONTACT_CONCURRENCY)
+        
+        async def send_for_contact(contact: dict, occasion: str):
+            async with contact_semaphore:
+                started = time.perf_counter()
+                await send_reminder_messages(
+                    user, contact, occasion, results, run, local_date.isoformat(), message_context, credits, batches
+                )
+                run.timings.add_contact(time.perf_counter() - started, {
+                    "user_id": user_id,
+                    "contact_id": contact["id"],
+                    "contact_name": contact["name"],
+                    "occasion": occasion
+                })
+        
+        due = []
+        planned = {channel: 0 for channel in REMINDER_CHANNELS}
+        for contact in contacts:
+            contact = parse_from_mongo(contact)
+            
+            for occasion, key in (("birthday", "bday_md"), ("anniversary", "anniv_md")):
+                if contact.get(key) == today_md:
+                    due.append((contact, occasion))
+                    for channel in REMINDER_CHANNELS:
+                        if contact.get(channel):
+                            planned[channel] += 1
+        
+        # Reserve credits for every planned send up front, then refund the unused ones once
+        with run.timings.stage("credit_writes"):
+            credits = await CreditReservation.reserve(user, planned, run.run_id)
+        
+        # Inline sends of batching channels are collected while contacts resolve and sent after
+        batches = {} if REMINDER_DELIVERY_MODE != "queue" else None
+        try:
+            await asyncio.gather(*(send_for_contact(contact, occasion) for contact, occasion in due))
+            for channel, jobs in (batches or {}).items():
+                await send_reminder_batch(user, channel, jobs, results, run, credits)
+        finally:
+            with run.timings.stage("credit_writes"):
+                await credits.settle()
+                    
+    except Exception as user_error:
+        results["errors"].append(f"Error processing user {user.get('email', user_id)}: {str(user_error)}")
+    
+    return results
+
+async def save_reminder_log(run: ReminderRunContext, results: dict):
+    """Write the run's ReminderLog; counters are added with $inc because queue
+    workers and the other shards of a sharded run report to the same document"""
+    log_entry = ReminderLog(
+        id=run.run_id,
+        date=run.execution_time.date().isoformat(),
+        execution_time=run.execution_time
+    )
+    log_dict = prepare_for_mongo(log_entry.dict(
+        exclude={*REMINDER_COUNTERS, "errors", "stage_timings", "queued_stage_timings", "slowest_contacts", "shard_timings"}
+    ))
+    
+    # Percentiles cannot be merged, so each shard of a sharded run keeps its own breakdown
+    timings = {"stage_timings": run.timings.summary(), "slowest_contacts": run.timings.slowest_contacts()}
+    if run.shard:
+        log_dict[f"shard_timings.{run.shard[0]}"] = timings
+    else:
+        log_dict.update(timings)
+    
+    await upsert_reminder_log(run.run_id, {
+        "$set": log_dict,
+        "$inc": {key: results[key] for key in REMINDER_COUNTERS},
+        "$push": {"errors": {"$each": results["errors"]}}
+    })
 
 @api_router.post("/system/daily-reminders")
-async def process_daily_reminders():
-    """Process all daily birthday/anniversary reminders - Internal system endpoint"""
+async def process_daily_reminders(
+    dry_run: bool = False,
+    now: Optional[datetime] = None,
+    hours: float = 0,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Process all daily birthday/anniversary reminders - Internal system endpoint.
+    With dry_run the send plan for the slots between `now` and `hours` later is streamed
+    as NDJSON instead; nothing is claimed, generated or sent. The plan lists every tenant's
+    recipients, so dry runs are admin only."""
+    if not dry_run and (now is not None or hours):
+        # A real run always uses the current time; shifting it would claim future slots early
+        raise HTTPException(status_code=400, detail="now and hours are only accepted with dry_run=true")
+    
+    if dry_run:
+        if credentials is None:
+            raise HTTPException(status_code=401, detail="Dry runs require an admin token")
+        await get_admin_user(await get_current_user(credentials))
+        if not 0 <= hours <= REMINDER_PLAN_MAX_HOURS:
+            raise HTTPException(status_code=400, detail=f"hours must be between 0 and {REMINDER_PLAN_MAX_HOURS:g}")
+    
+    if now is not None and now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+    
+    if dry_run:
+        return StreamingResponse(
+            (json.dumps(entry, default=str) + "\n" async for entry in plan_daily_reminders(now, hours)),
+            media_type="application/x-ndjson"
+        )
+    
+    return await run_daily_reminders(ReminderRunContext(execution_time=now))
+
+async def complete_reminder_slot(settings: dict, slot: datetime, now: datetime):
+    """Finish a claimed slot: record its local date as completed and schedule the next slot"""
+    try:
+        local_date = slot.astimezone(pytz.timezone(settings.get("timezone") or "UTC")).date().isoformat()
+    except Exception:
+        local_date = slot.date().isoformat()
+    next_send_at = compute_next_send_at(settings.get("daily_send_time"), settings.get("timezone"), max(slot, now))
     
-    execution_time = datetime.now(timezone.utc)
+    await db.user_settings.update_one(
+        {"user_id": settings["user_id"], "pending_slot_utc": utc_iso(slot)},
+        {
+            "$set": {
+                "next_send_at_utc": utc_iso(next_send_at) if next_send_at else None,
+                "last_completed_local_date": local_date
+            },
+            "$unset": {"pending_slot_utc": "", "pending_run_id": ""}
+        }
+    )
+
+async def run_daily_reminders(run: Optional[ReminderRunContext] = None, shard: Optional[tuple] = None):
+    """Run one reminder tick; `shard=(index, count)` restricts it to the users hashed into
+    that shard so a large run can be split across processes (see reminders.py)"""
+    if run is None:
+        run = ReminderRunContext()
+    run.shard = shard
+    execution_time = run.execution_time
     today = execution_time.date()
     
     results = {
+        "run_id": run.run_id,
         "execution_time": execution_time.isoformat(),
         "date": today.isoformat(),
-        "total_users": 0,
-        "messages_sent": 0,
-        "whatsapp_sent": 0,
-        "email_sent": 0,
-        "errors": []
+        **new_reminder_results()
     }
     
     try:
-        # Get all users with active subscriptions
-        users = await db.users.find({
-            "subscription_status": {"$in": ["active", "trial"]}
-        }).to_list(1000)
-        
-        for user in users:
-            user = parse_from_mongo(user)
-            user_id = user["id"]
-            results["total_users"] += 1
+        window = timedelta(minutes=REMINDER_SEND_WINDOW_MINUTES)
+        
+        # Users run concurrently up to REMINDER_USER_CONCURRENCY; each returns its own
+        # result bucket so nothing shared is mutated across tasks
+        user_semaphore = asyncio.Semaphore(REMINDER_USER_CONCURRENCY)
+        
+        async def run_user(user: dict, settings: dict, send_at: datetime):
+            async with user_semaphore:
+                partial = await process_user_reminders(user, settings, send_at, run)
+            if send_at < execution_time - window:
+                partial["users_caught_up"] += 1
+            await complete_reminder_slot(settings, send_at, execution_time)
+            return partial
+        
+        async def run_claimed(claimed: dict):
+            await start_reminder_log(run)
+            # Get the claimed users with active subscriptions
+            users = db.users.find(
+                {"id": {"$in": list(claimed)}, "subscription_status": {"$in": ["active", "trial"]}},
+                {"password_hash": 0}
+            ).batch_size(MONGO_BATCH_SIZE)
+            tasks = []
+            async for user in run.timings.timed("user_selection", users):
+                tasks.append(run_user(parse_from_mongo(user), *claimed.pop(user["id"])))
+            # Users without an active subscription have nothing to send; release their claim
+            tasks.extend(complete_reminder_slot(settings, slot, execution_time) for settings, slot in claimed.values())
+            for partial in await asyncio.gather(*tasks):
+                if partial:
+                    merge_reminder_results(results, partial)
+        
+        # Stream the settings whose next send instant has come (indexed). This includes users
+        # whose send time passed during missed ticks and claims whose run never completed,
+        # so one pass catches up after an outage. Claimed users are dispatched in
+        # MONGO_BATCH_SIZE chunks, so there is no cap on users. A chunk can take longer than
+        # the server keeps an idle cursor open, so the cursor is closed while it runs and the
+        # query resumes after the last settings read; claiming moved the claimed users' slots
+        # past the horizon, so they are not read again.
+        resume_after = None
+        while True:
+            due_settings = due_settings_cursor(execution_time + reminder_claim_horizon(), resume_after)
             
-            try:
-                # Get user settings for send time and timezone
-                settings = await db.user_settings.find_one({"user_id": user_id})
-                if not settings:
+            claimed = {}
+            chunk_full = False
+            async for settings in run.timings.timed("settings_lookup", due_settings):
+                resume_after = (settings["next_send_at_utc"], settings["user_id"])
+                if shard and user_shard(settings["user_id"], shard[1]) != shard[0]:
                     continue
-                    
-                user_timezone = settings.get("timezone", "UTC")
-                daily_send_time = settings.get("daily_send_time", "09:00")
                 
-                # Convert to user's timezone and check if it's time to send
-                try:
-                    user_tz = pytz.timezone(user_timezone)
-                    user_now = execution_time.astimezone(user_tz)
-                    
-                    send_hour, send_minute = map(int, daily_send_time.split(":"))
-                    
-                    # Check if current time is within 15-minute window of user's preferred send time
-                    current_minutes = user_now.hour * 60 + user_now.minute
-                    target_minutes = send_hour * 60 + send_minute
-                    
-                    # Allow 15-minute window (since cron runs every 15 minutes)
-                    if abs(current_minutes - target_minutes) > 15:
-                        continue
-                        
-                except Exception as tz_error:
-                    results["errors"].append(f"Timezone error for user {user['email']}: {str(tz_error)}")
-                    continue
+                # A claim that never completed keeps its original slot in pending_slot_utc
+                slot_value = settings["next_send_at_utc"]
+                slot = datetime.fromisoformat(settings.get("pending_slot_utc") or slot_value)
+                due = reminder_slot_is_due(settings, slot, execution_time)
                 
-                # Get contacts for this user
-                contacts = await db.contacts.find({"user_id": user_id}).to_list(1000)
+                # Claim each due user by leasing next_send_at_utc; a concurrent tick that read
+                # the same value will match nothing and skip the user. Slots from an earlier
+                # local day are skipped straight to the next one.
+                if due:
+                    update = {"$set": {
+                        "next_send_at_utc": utc_iso(execution_time + timedelta(minutes=REMINDER_CLAIM_LEASE_MINUTES)),
+                        "pending_slot_utc": utc_iso(slot),
+                        "pending_run_id": run.run_id
+                    }}
+                else:
+                    next_send_at = compute_next_send_at(
+                        settings.get("daily_send_time"), settings.get("timezone"), max(slot, execution_time)
+                    )
+                    update = {
+                        "$set": {"next_send_at_utc": utc_iso(next_send_at) if next_send_at else None},
+                        "$unset": {"pending_slot_utc": "", "pending_run_id": ""}
+                    }
+                with run.timings.stage("settings_lookup"):
+                    claim = await db.user_settings.update_one(
+                        {"user_id": settings["user_id"], "next_send_at_utc": slot_value},
+                        update
+                    )
+                if claim.modified_count and not due and settings.get("pending_run_id"):
+                    # The skipped slot's unfinished run may have left credits reserved
+                    await release_stale_credit_reservations(settings["user_id"], settings["pending_run_id"])
+                if claim.modified_count == 0 or not due:
+                    continue
                 
-                for contact in contacts:
-                    contact = parse_from_mongo(contact)
-                    
-                    # Check birthday
-                    if contact.get("birthday"):
-                        try:
-                            birthday = datetime.fromisoformat(contact["birthday"]).date()
-                            if birthday.month == today.month and birthday.day == today.day:
-                                await send_reminder_messages(user, contact, "birthday", results)
-                        except Exception as bd_error:
-                            results["errors"].append(f"Birthday parsing error for {contact['name']}: {str(bd_error)}")
-                    
-                    # Check anniversary
-                    if contact.get("anniversary_date"):
-                        try:
-                            anniversary = datetime.fromisoformat(contact["anniversary_date"]).date()
-                            if anniversary.month == today.month and anniversary.day == today.day:
-                                await send_reminder_messages(user, contact, "anniversary", results)
-                        except Exception as ann_error:
-                            results["errors"].append(f"Anniversary parsing error for {contact['name']}: {str(ann_error)}")
-                            
-            except Exception as user_error:
-                results["errors"].append(f"Error processing user {user.get('email', user_id)}: {str(user_error)}")
-        
-        # Log execution results
-        log_entry = ReminderLog(
-            date=today.isoformat(),
-            execution_time=execution_time,
-            total_users=results["total_users"],
-            messages_sent=results["messages_sent"],
-            whatsapp_sent=results["whatsapp_sent"],
-            email_sent=results["email_sent"],
-            errors=results["errors"]
-        )
+                run.settings.put(settings)
+                claimed[settings["user_id"]] = (settings, slot)
+                if len(claimed) >= MONGO_BATCH_SIZE:
+                    chunk_full = True
+                    break
+            await due_settings.close()
+            
+            if claimed:
+                await run_claimed(claimed)
+            if not chunk_full:
+                break
         
-        await db.reminder_logs.insert_one(prepare_for_mongo(log_entry.dict()))
+        # Log execution results; ticks that claimed nobody leave no log behind
+        if results["total_users"] or results["errors"]:
+            await save_reminder_log(run, results)
         
         return results
         
@@ -2359,21 +4281,211 @@ async def process_daily_reminders():
         
         # Still try to log the execution
         try:
-            log_entry = ReminderLog(
-                date=today.isoformat(),
-                execution_time=execution_time,
-                total_users=results["total_users"],
-                messages_sent=results["messages_sent"],
-                whatsapp_sent=results["whatsapp_sent"],
-                email_sent=results["email_sent"],
-                errors=results["errors"]
-            )
-            await db.reminder_logs.insert_one(prepare_for_mongo(log_entry.dict()))
+            await save_reminder_log(run, results)
         except:
             pass
             
         return results
 
+# Dry-run Planning
+async def plan_user_reminders(user: dict, settings: dict, send_at: datetime, credits: dict) -> List[dict]:
+    """Plan entries for one user's send slot; mirrors send_reminder_messages without side effects.
+    `credits` is the user's running balance across their planned slots."""
+    try:
+        user_tz = pytz.timezone(settings.get("timezone") or "UTC")
+        local_date = send_at.astimezone(user_tz).date()
+    except Exception:
+        return []
+    today_md = event_month_day(local_date)
+    
+    contacts = [
+        parse_from_mongo(contact) async for contact in db.contacts.find({
+            "user_id": user["id"],
+            "$or": [{"bday_md": today_md}, {"anniv_md": today_md}]
+        }).batch_size(MONGO_BATCH_SIZE)
+    ]
+    if not contacts:
+        return []
+    
+    message_context = await ReminderMessageContext.load(
+        user, [contact["id"] for contact in contacts], local_date.isoformat()
+    )
+    already_claimed = {
+        (entry["contact_id"], entry["occasion"], entry["channel"])
+        async for entry in db.sent_ledger.find(
+            {"user_id": user["id"], "local_date": local_date.isoformat()},
+            {"contact_id": 1, "occasion": 1, "channel": 1}
+        )
+    }
+    
+    entries = []
+    for contact in contacts:
+        occasions = [
+            occasion for occasion, key in (("birthday", "bday_md"), ("anniversary", "anniv_md"))
+            if contact.get(key) == today_md
+        ]
+        for occasion in occasions:
+            for channel in REMINDER_CHANNELS:
+                # Same eligibility as a real run: reachable and unlimited or a credit left to reserve
+                unlimited = user.get(f"unlimited_{channel}", False)
+                if not contact.get(channel) or (not unlimited and credits[channel] <= 0):
+                    continue
+                
+                source, _, image = message_context.select(contact, occasion, channel)
+                if not unlimited:
+                    credits[channel] -= 1
+                entries.append({
+                    "type": "send",
+                    "user_id": user["id"],
+                    "user_email": user["email"],
+                    "contact_id": contact["id"],
+                    "contact_name": contact["name"],
+                    "occasion": occasion,
+                    "channel": channel,
+                    "recipient": contact[channel],
+                    "send_at": utc_iso(send_at),
+                    "local_date": local_date.isoformat(),
+                    "message_source": source,
+                    "image_url": image,
+                    "already_claimed": (contact["id"], occasion, channel) in already_claimed,
+                    "credit_cost": 0 if unlimited else 1,
+                    "credits_remaining": None if unlimited else credits[channel]
+                })
+    return entries
+
+async def plan_daily_reminders(
+    now: Optional[datetime] = None,
+    hours: float = 0,
+    shard: Optional[tuple] = None,
+    bucket_minutes: int = 15
+):
+    """Yield the send plan for every slot a reminder tick at `now` would pick up, plus the
+    slots in the following `hours`, then a summary with sends per `bucket_minutes` window"""
+    now = now or datetime.now(timezone.utc)
+    window = timedelta(minutes=REMINDER_SEND_WINDOW_MINUTES)
+    start, end = now - window, now + reminder_claim_horizon() + timedelta(hours=hours)
+    
+    summary = {
+        "type": "summary",
+        "now": now.isoformat(),
+        "from": start.isoformat(),
+        "until": end.isoformat(),
+        "total_users": 0,
+        "sends": {channel: 0 for channel in REMINDER_CHANNELS},
+        "already_claimed": 0,
+        "credits_required": {channel: 0 for channel in REMINDER_CHANNELS},
+        "message_sources": {},
+        "windows": {}
+    }
+    
+    async def plan_chunk(pending: dict):
+        users = db.users.find(
+            {"id": {"$in": list(pending)}, "subscription_status": {"$in": ["active", "trial"]}},
+            {"password_hash": 0}
+        ).batch_size(MONGO_BATCH_SIZE)
+        async for user in users:
+            settings, slots = pending[user["id"]]
+            credits = {channel: user.get(f"{channel}_credits", 0) for channel in REMINDER_CHANNELS}
+            summary["total_users"] += 1
+            for slot in slots:
+                for entry in await plan_user_reminders(user, settings, slot, credits):
+                    yield entry
+    
+    # Same indexed query as a real tick, widened to the planning horizon. Like a real tick,
+    # the cursor is closed while a chunk is planned and reopened after the last settings read.
+    resume_after = None
+    while True:
+        due_settings = due_settings_cursor(end, resume_after)
+        pending = {}
+        chunk_full = False
+        async for settings in due_settings:
+            resume_after = (settings["next_send_at_utc"], settings["user_id"])
+            if shard and user_shard(settings["user_id"], shard[1]) != shard[0]:
+                continue
+            
+            # Walk the user's slots from the stored (or pending) send instant; a slot before the
+            # window is only run if the catch-up rule still considers it due
+            slots = []
+            slot = datetime.fromisoformat(settings.get("pending_slot_utc") or settings["next_send_at_utc"])
+            if slot < start and reminder_slot_is_due(settings, slot, now):
+                slots.append(slot)
+            while slot and slot <= end:
+                if slot >= start:
+                    slots.append(slot)
+                slot = compute_next_send_at(
+                    settings.get("daily_send_time"), settings.get("timezone"),
+                    slot if slot >= start else start - timedelta(seconds=1)
+                )
+            if slots:
+                pending[settings["user_id"]] = (settings, slots)
+            
+            if len(pending) >= MONGO_BATCH_SIZE:
+                chunk_full = True
+                break
+        await due_settings.close()
+        
+        if pending:
+            async for entry in plan_chunk(pending):
+                yield entry
+                summary_add_plan_entry(summary, entry, bucket_minutes)
+        if not chunk_full:
+            break
+    
+    summary["windows"] = dict(sorted(summary["windows"].items()))
+    yield summary
+
+def summary_add_plan_entry(summary: dict, entry: dict, bucket_minutes: int):
+    if entry["already_claimed"]:
+        summary["already_claimed"] += 1
+        return
+    
+    channel = entry["channel"]
+    send_at = datetime.fromisoformat(entry["send_at"])
+    bucket = send_at.replace(minute=send_at.minute - send_at.minute % bucket_minutes, second=0)
+    window = summary["windows"].setdefault(bucket.isoformat(), {c: 0 for c in REMINDER_CHANNELS})
+    window[channel] += 1
+    summary["sends"][channel] += 1
+    summary["credits_required"][channel] += entry["credit_cost"]
+    summary["message_sources"][entry["message_source"]] = summary["message_sources"].get(entry["message_source"], 0) + 1
+
+@api_router.post("/system/pregenerate-messages")
+async def trigger_message_pregeneration(
+    days_ahead: int = PREGENERATION_DAYS_AHEAD,
+    admin_user: User = Depends(get_admin_user)
+):
+    """Pre-generate AI messages for upcoming events - Admin only. Every message is an LLM
+    call, so days_ahead is capped at PREGENERATION_DAYS_AHEAD."""
+    return await pregenerate_upcoming_messages(max(0, min(days_ahead, PREGENERATION_DAYS_AHEAD)))
+
+def merge_stage_timings(logs: List[dict]) -> tuple:
+    """Combine the per-run stage breakdowns of many reminder logs. Counts and totals add up;
+    percentiles cannot be merged, so the worst single-run p50/p95 is reported."""
+    stage_timings = {}
+    slowest_contacts = []
+    
+    for log in logs:
+        breakdowns = [log] + list((log.get("shard_timings") or {}).values())
+        for breakdown in breakdowns:
+            for stage, timing in (breakdown.get("stage_timings") or {}).items():
+                merged = stage_timings.setdefault(stage, {
+                    "count": 0, "total_seconds": 0.0, "p50_seconds": 0.0, "p95_seconds": 0.0, "max_seconds": 0.0
+                })
+                merged["count"] += timing.get("count", 0)
+                merged["total_seconds"] = round(merged["total_seconds"] + timing.get("total_seconds", 0), 4)
+                for key in ("p50_seconds", "p95_seconds", "max_seconds"):
+                    merged[key] = max(merged[key], timing.get(key, 0))
+            for contact in breakdown.get("slowest_contacts") or []:
+                slowest_contacts.append({**contact, "run_id": log.get("id")})
+        
+        for stage, timing in (log.get("queued_stage_timings") or {}).items():
+            merged = stage_timings.setdefault(f"queued_{stage}", {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            merged["count"] += timing.get("count", 0)
+            merged["total_seconds"] = round(merged["total_seconds"] + timing.get("total_seconds", 0), 4)
+            merged["max_seconds"] = max(merged["max_seconds"], timing.get("max_seconds", 0))
+    
+    slowest_contacts.sort(key=lambda contact: contact["seconds"], reverse=True)
+    return stage_timings, slowest_contacts[:REMINDER_SLOWEST_CONTACTS]
+
 @api_router.get("/admin/reminder-stats", response_model=DailyReminderStats)
 async def get_reminder_stats(
     date: Optional[str] = None, 
@@ -2384,10 +4496,8 @@ async def get_reminder_stats(
     if not date:
         date = datetime.now(timezone.utc).date().isoformat()
     
-    # Get execution logs for the specified date
-    logs = await db.reminder_logs.find({
-        "date": date
-    }).to_list(100)
+    # Get execution logs for the specified date (one per scheduler tick, so streamed)
+    logs = [log async for log in db.reminder_logs.find({"date": date}).batch_size(MONGO_BATCH_SIZE)]
     
     if not logs:
         return DailyReminderStats(
@@ -2411,6 +4521,8 @@ async def get_reminder_stats(
         if log.get("errors"):
             all_errors.extend(log["errors"])
     
+    stage_timings, slowest_contacts = merge_stage_timings(logs)
+    
     return DailyReminderStats(
         date=date,
         total_executions=len(logs),
@@ -2418,27 +4530,114 @@ async def get_reminder_stats(
         total_messages_sent=total_messages,
         whatsapp_messages=whatsapp_messages,
         email_messages=email_messages,
-        errors=all_errors
+        errors=all_errors,
+        stage_timings=stage_timings,
+        slowest_contacts=slowest_contacts
     )
 
 @api_router.get("/admin/reminder-logs")
 async def get_reminder_logs(
     days: int = 7,
+    skip: int = 0,
+    limit: Optional[int] = None,
     admin_user: User = Depends(get_admin_user)
 ):
-    """Get reminder execution logs for the past N days"""
+    """Get reminder execution logs for the past N days, newest first. The scheduler can log
+    a run every minute, so all of them are returned unless a page is asked for with skip/limit."""
     
     end_date = datetime.now(timezone.utc).date()
     start_date = end_date - timedelta(days=days)
     
-    logs = await db.reminder_logs.find({
+    logs = db.reminder_logs.find({
         "date": {
             "$gte": start_date.isoformat(),
             "$lte": end_date.isoformat()
         }
-    }).sort("date", -1).to_list(days * 24)  # Max entries per day
+    }).sort([("date", -1), ("execution_time", -1)]).skip(max(0, skip)).batch_size(MONGO_BATCH_SIZE)
+    if limit is not None:
+        logs = logs.limit(max(1, limit))
+    
+    return [ReminderLog(**parse_from_mongo(log)) async for log in logs]
+
+@api_router.get("/admin/outbound-queue")
+async def get_outbound_queue_stats(admin_user: User = Depends(get_admin_user)):
+    """Get outbound job counts by status for monitoring the delivery workers"""
+    
+    status_counts = await db.outbound_jobs.aggregate([
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]).to_list(10)
+    
+    return {
+        "delivery_mode": REMINDER_DELIVERY_MODE,
+        "workers_per_process": OUTBOUND_WORKERS,
+        "jobs": {entry["_id"]: entry["count"] for entry in status_counts},
+        "channels": [provider.capabilities() for provider in channel_providers.values()],
+        "dead_letters_pending_replay": await db.dead_letters.count_documents({"replayed_at": None})
+    }
+
+def dead_letter_query(channel: Optional[str], user_id: Optional[str], include_replayed: bool = False) -> dict:
+    query = {} if include_replayed else {"replayed_at": None}
+    if channel:
+        query["channel"] = channel
+    if user_id:
+        query["user_id"] = user_id
+    return query
+
+@api_router.get("/admin/dead-letters")
+async def get_dead_letters(
+    channel: Optional[str] = None,
+    user_id: Optional[str] = None,
+    include_replayed: bool = False,
+    limit: int = 100,
+    admin_user: User = Depends(get_admin_user)
+):
+    """Get sends that failed permanently or ran out of retries, newest first"""
+    
+    dead_letters = await db.dead_letters.find(
+        dead_letter_query(channel, user_id, include_replayed), {"_id": 0}
+    ).sort("dead_lettered_at", -1).to_list(limit)
     
-    return [ReminderLog(**parse_from_mongo(log)) for log in logs]
+    return dead_letters
+
+@api_router.post("/admin/dead-letters/{dead_letter_id}/replay")
+async def replay_single_dead_letter(dead_letter_id: str, admin_user: User = Depends(get_admin_user)):
+    """Put one dead-lettered send back on the outbound queue"""
+    
+    dead_letter = await db.dead_letters.find_one({"id": dead_letter_id})
+    if not dead_letter:
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    
+    outcome = await replay_dead_letter(dead_letter)
+    if outcome == "already_replayed":
+        raise HTTPException(status_code=409, detail="Dead letter was already replayed")
+    if outcome == "no_credits":
+        raise HTTPException(status_code=402, detail=f"The user has no {dead_letter['channel']} credits left")
+    
+    return {"message": "Dead letter queued for delivery", "job_id": dead_letter["job_id"]}
+
+@api_router.post("/admin/dead-letters/replay")
+async def replay_dead_letters(
+    channel: Optional[str] = None,
+    user_id: Optional[str] = None,
+    admin_user: User = Depends(get_admin_user)
+):
+    """Put every not yet replayed dead letter (optionally one channel or user) back on the queue"""
+    
+    replayed = 0
+    skipped_no_credits = 0
+    dead_letters = db.dead_letters.find(dead_letter_query(channel, user_id)).batch_size(MONGO_BATCH_SIZE)
+    async for dead_letter in dead_letters:
+        outcome = await replay_dead_letter(dead_letter)
+        if outcome == "replayed":
+            replayed += 1
+        elif outcome == "no_credits":
+            skipped_no_credits += 1
+    
+    return {
+        "message": f"Queued {replayed} dead letters for delivery",
+        "replayed": replayed,
+        "skipped_no_credits": skipped_no_credits
+    }
 
 # Enhanced Admin User Management
 # OLD ADMIN ENDPOINTS - COMMENTED OUT (replaced by new separate admin system)
@@ -2943,10 +5142,342 @@ async def update_user_subscription(
     
     return {"message": "Subscription updated successfully", "updated_fields": list(update_fields.keys())}
 
+# Delivery Status Webhooks
+# Provider event -> delivery status; None only adds the event to the message's timeline
+BREVO_EVENT_STATUSES = {
+    "request": "sent",
+    "delivered": "delivered",
+    "deferred": "deferred",
+    "soft_bounce": "deferred",
+    "hard_bounce": "bounced",
+    "invalid_email": "bounced",
+    "blocked": "failed",
+    "error": "failed",
+    "spam": "complaint",
+    "complaint": "complaint",
+    "opened": None,
+    "unique_opened": None,
+    "proxy_open": None,
+    "click": None,
+    "unsubscribed": None
+}
+DIGITALSMS_EVENT_STATUSES = {
+    "sent": "sent",
+    "submitted": "sent",
+    "delivrd": "delivered",
+    "delivered": "delivered",
+    "read": None,
+    "undeliv": "failed",
+    "undelivered": "failed",
+    "failed": "failed",
+    "rejectd": "failed",
+    "rejected": "failed",
+    "expired": "failed"
+}
+
+class DeliveryEventBuffer:
+    """Delivery status writes collected in memory and bulk-written to db.delivery_status
+    when DELIVERY_EVENTS_FLUSH_SIZE are waiting or every DELIVERY_EVENTS_FLUSH_SECONDS"""
+    
+    def __init__(self):
+        self.operations: List[UpdateOne] = []
+        self.lock = asyncio.Lock()
+        # Set while the last flush left events unapplied; retries then wait for the periodic flush
+        self.backlogged = False
+    
+    async def add(self, operation: UpdateOne):
+        self.operations.append(operation)
+        if len(self.operations) >= DELIVERY_EVENTS_FLUSH_SIZE and not self.backlogged:
+            await self.flush()
+    
+    async def flush(self) -> int:
+        """Write the buffered events; returns how many left the buffer. Events a failed write
+        did not apply stay buffered for the next flush."""
+        async with self.lock:
+            operations, self.operations = self.operations, []
+            if not operations:
+                return 0
+            unapplied = []
+            try:
+                # Ordered, so events for one message apply in the order they arrived
+                await db.delivery_status.bulk_write(operations, ordered=True)
+            except BulkWriteError as e:
+                # The write stopped at the failed operation; the ones before it were applied
+                error = e.details["writeErrors"][0]
+                failed = error["index"]
+                if error.get("code") == 11000:
+                    # An upsert that lost an insert race to another writer succeeds when retried
+                    unapplied = operations[failed:]
+                else:
+                    logger.error(f"Dropped delivery status event {operations[failed]}: {error.get('errmsg')}")
+                    unapplied = operations[failed + 1:]
+            except Exception as e:
+                logger.error(f"Delivery status flush of {len(operations)} events failed, will retry: {str(e)}")
+                unapplied = operations
+            
+            # Ahead of events that arrived during the write, so the order is kept
+            self.operations = unapplied + self.operations
+            self.backlogged = bool(unapplied)
+            return len(operations) - len(unapplied)
+    
+    async def run(self):
+        """Periodic flush, started with the app; flushes once more when cancelled"""
+        while True:
+            try:
+                await asyncio.sleep(DELIVERY_EVENTS_FLUSH_SECONDS)
+                await self.flush()
+            except asyncio.CancelledError:
+                await self.flush()
+                raise
+
+delivery_events = DeliveryEventBuffer()
+
+async def track_sent_message(job: dict, result: dict):
+    """Start the delivery status of an accepted message so later webhook events map to its user"""
+    if not result.get("message_id"):
+        return
+    now = utc_iso(datetime.now(timezone.utc))
+    await delivery_events.add(UpdateOne(
+        {"provider": channel_providers[job["channel"]].provider, "message_id": result["message_id"]},
+        {
+            # A webhook event may have created the document first; it keeps its status
+            "$set": {
+                "user_id": job["user_id"],
+                "job_id": job["id"],
+                "channel": job["channel"],
+                "recipient": job["recipient"]
+            },
+            "$setOnInsert": {"status": "sent", "created_at": now},
+            "$min": {"timeline.sent": now}
+        },
+        upsert=True
+    ))
+
+async def record_delivery_event(provider: str, message_id: str, event: str, status: Optional[str], occurred_at: str, reason: Optional[str] = None):
+    update = {
+        "$min": {f"timeline.{event}": occurred_at},
+        "$setOnInsert": {"created_at": utc_iso(datetime.now(timezone.utc))},
+        "$max": {"last_event_at": occurred_at}
+    }
+    if status:
+        update["$set"] = {"status": status}
+        if reason:
+            update["$set"]["reason"] = reason
+    await delivery_events.add(UpdateOne({"provider": provider, "message_id": message_id}, update, upsert=True))
+
+def check_webhook_token(token: Optional[str]):
+    if not DELIVERY_WEBHOOK_TOKEN:
+        raise HTTPException(status_code=503, detail="Delivery webhooks are not configured")
+    if not secrets.compare_digest(token or "", DELIVERY_WEBHOOK_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
+
+def event_time(value) -> str:
+    """Provider event time (unix seconds or ISO string) as a utc_iso string; now if missing"""
+    try:
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+            return utc_iso(datetime.fromtimestamp(int(value), timezone.utc))
+        if value:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+            return utc_iso(parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc))
+    except (ValueError, OverflowError, OSError):
+        pass
+    return utc_iso(datetime.now(timezone.utc))
+
+@api_router.post("/webhooks/brevo")
+async def brevo_webhook(request: Request, token: Optional[str] = None):
+    """Brevo transactional email events; accepts one event or a batched list"""
+    check_webhook_token(token)
+    
+    payload = await request.json()
+    events = payload if isinstance(payload, list) else [payload]
+    accepted = 0
+    for event in events:
+        name = str(event.get("event", "")).lower()
+        message_id = event.get("message-id") or event.get("message_id")
+        if not message_id or name not in BREVO_EVENT_STATUSES:
+            continue
+        await record_delivery_event(
+            "brevo",
+            message_id,
+            name,
+            BREVO_EVENT_STATUSES[name],
+            event_time(event.get("ts_event") or event.get("date")),
+            event.get("reason")
+        )
+        accepted += 1
+    
+    return {"accepted": accepted}
+
+@api_router.api_route("/webhooks/digitalsms", methods=["GET", "POST"])
+async def digitalsms_webhook(request: Request, token: Optional[str] = None):
+    """DigitalSMS delivery reports, as query parameters, a form or JSON (one report or a list)"""
+    check_webhook_token(token)
+    
+    if request.method == "GET":
+        reports = [dict(request.query_params)]
+    elif request.headers.get("content-type", "").startswith("application/json"):
+        payload = await request.json()
+        reports = payload if isinstance(payload, list) else [payload]
+    else:
+        reports = [dict(await request.form())]
+    
+    accepted = 0
+    for report in reports:
+        name = str(report.get("status", "")).lower()
+        message_id = report.get("requestid") or report.get("msgid") or report.get("message_id")
+        if not message_id or name not in DIGITALSMS_EVENT_STATUSES:
+            continue
+        await record_delivery_event(
+            "digitalsms",
+            str(message_id),
+            name,
+            DIGITALSMS_EVENT_STATUSES[name],
+            event_time(report.get("timestamp") or report.get("delivered_at")),
+            report.get("reason") or report.get("description")
+        )
+        accepted += 1
+    
+    return {"accepted": accepted}
+
+@api_router.get("/dashboard/delivery-stats")
+async def get_delivery_stats(days: int = 30, current_user: User = Depends(get_current_user)):
+    """Delivery outcomes of the user's messages over the last `days`, by channel and status"""
+    since = utc_iso(datetime.now(timezone.utc) - timedelta(days=days))
+    counts = await db.delivery_status.aggregate([
+        {"$match": {"user_id": current_user.id, "created_at": {"$gte": since}}},
+        {"$group": {"_id": {"channel": "$channel", "status": "$status"}, "count": {"$sum": 1}}}
+    ]).to_list(None)
+    
+    stats = {channel: {} for channel in REMINDER_CHANNELS}
+    for entry in counts:
+        stats.setdefault(entry["_id"]["channel"], {})[entry["_id"]["status"]] = entry["count"]
+    return {"days": days, "channels": stats}
+
+# In-process Scheduler
+async def acquire_scheduler_lease(name: str, lease_seconds: int = SCHEDULER_LEASE_SECONDS) -> bool:
+    """Take or renew the lease on a scheduler lock document; True while this process leads"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.scheduler_locks.update_one(
+            {"_id": name, "$or": [{"holder": WORKER_ID}, {"lease_expires_at": {"$lte": utc_iso(now)}}]},
+            {"$set": {"holder": WORKER_ID, "lease_expires_at": utc_iso(now + timedelta(seconds=lease_seconds))}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another replica holds an unexpired lease, so the upsert collided with its document
+        return False
+    return True
+
+async def release_scheduler_lease(name: str):
+    await db.scheduler_locks.update_one(
+        {"_id": name, "holder": WORKER_ID},
+        {"$set": {"lease_expires_at": utc_iso(datetime.now(timezone.utc))}}
+    )
+
+class ScheduledJob:
+    def __init__(self, name: str, interval_seconds: float, func):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self.is_leader = False
+        self.runs = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_finished_at: Optional[datetime] = None
+        self.last_duration_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.next_run_at: Optional[datetime] = None
+    
+    def state(self) -> dict:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval_seconds,
+            "is_leader": self.is_leader,
+            "runs": self.runs,
+            "last_started_at": self.last_started_at.isoformat() if self.last_started_at else None,
+            "last_finished_at": self.last_finished_at.isoformat() if self.last_finished_at else None,
+            "last_duration_seconds": self.last_duration_seconds,
+            "last_error": self.last_error,
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None
+        }
+
+class LeaderScheduler:
+    """Runs periodic jobs on whichever replica holds each job's lease in db.scheduler_locks"""
+    
+    def __init__(self, lease_seconds: int = SCHEDULER_LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        self.jobs: List[ScheduledJob] = []
+    
+    def add_job(self, name: str, interval_seconds: float, func):
+        self.jobs.append(ScheduledJob(name, interval_seconds, func))
+    
+    def start(self) -> list:
+        return [asyncio.create_task(self.run_job(job)) for job in self.jobs]
+    
+    async def keep_lease(self, job: ScheduledJob):
+        """Renew the lease while a long run is in progress"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            job.is_leader = await acquire_scheduler_lease(job.name, self.lease_seconds)
+            if not job.is_leader:
+                logger.warning(f"Scheduler lost the {job.name} lease during a run")
+    
+    async def run_job(self, job: ScheduledJob):
+        try:
+            while True:
+                tick_started = datetime.now(timezone.utc)
+                try:
+                    job.is_leader = await acquire_scheduler_lease(job.name, self.lease_seconds)
+                    if job.is_leader:
+                        job.last_started_at = tick_started
+                        heartbeat = asyncio.create_task(self.keep_lease(job))
+                        try:
+                            await job.func()
+                            job.last_error = None
+                        finally:
+                            heartbeat.cancel()
+                        job.runs += 1
+                        job.last_finished_at = datetime.now(timezone.utc)
+                        job.last_duration_seconds = (job.last_finished_at - tick_started).total_seconds()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    job.last_error = str(e)
+                    logger.error(f"Scheduled job {job.name} failed: {str(e)}")
+                
+                job.next_run_at = tick_started + timedelta(seconds=job.interval_seconds)
+                await asyncio.sleep(max(0, (job.next_run_at - datetime.now(timezone.utc)).total_seconds()))
+        except asyncio.CancelledError:
+            # Hand the lease over on shutdown instead of making other replicas wait it out
+            if job.is_leader:
+                await release_scheduler_lease(job.name)
+            raise
+    
+    async def state(self) -> dict:
+        locks = {lock["_id"]: lock async for lock in db.scheduler_locks.find({"_id": {"$in": [job.name for job in self.jobs]}})}
+        jobs = []
+        for job in self.jobs:
+            lock = locks.get(job.name, {})
+            jobs.append({**job.state(), "leader": lock.get("holder"), "lease_expires_at": lock.get("lease_expires_at")})
+        return {"enabled": SCHEDULER_ENABLED, "worker_id": WORKER_ID, "lease_seconds": self.lease_seconds, "jobs": jobs}
+
+scheduler = LeaderScheduler()
+scheduler.add_job("daily-reminders", SCHEDULER_TICK_SECONDS, lambda: process_daily_reminders())
+if PREGENERATION_DAYS_AHEAD > 0:
+    scheduler.add_job("pregenerate-messages", PREGENERATION_INTERVAL_MINUTES * 60, lambda: pregenerate_upcoming_messages())
+
+@api_router.get("/system/scheduler")
+async def get_scheduler_state(admin_user: User = Depends(get_admin_user)):
+    """Schedule, leadership and last-run state of the in-process scheduler"""
+    return await scheduler.state()
+
 # Health check
 @api_router.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "circuit_breakers": circuit_breakers.snapshot()
+    }
 
 # Include the router in the main app (after all endpoints are defined)
 app.include_router(api_router)
\ No newline at end of file
@@ -2,6 +2,7 @@
 
 # Daily Reminder System Setup Script
 # This script sets up the cron job for the birthday/anniversary reminder system
+# LEGACY: the backend schedules reminder runs itself; only use this with SCHEDULER_ENABLED=false
 
 echo "🚀 Setting up Daily Reminder System..."
 